@@ -1,215 +1,1014 @@
-# Project
-# -----------------------------------------------------------------------------
-# Title   : Dynamic Programming for Optimal Speedrun Strategy Exploration
-# Author  : [Twitter] @samuelladoco  [Twitch] SLDCtwitch
-# Contents: Dynamic programming algorithm (Dijkstra's algorithm for DAG)
-# -----------------------------------------------------------------------------
-
-
-# Import
-# -----------------------------------------------------------------------------
-from __future__ import annotations
-import dataclasses
-import functools
-import heapq
-#
-from level import Level
-# -----------------------------------------------------------------------------
-
-
-# Classes
-# -----------------------------------------------------------------------------
-# ----------------------------------------------------------------------
-@dataclasses.dataclass(frozen=True, order=True, )
-class Vertex:
-    """動的計画法の段階(グラフの頂点)"""
-    level: Level
-    cumlative_num_gems: int
-
-    def __repr__(self) -> str:
-        return f'({self.level.ep_pg}, {self.cumlative_num_gems})'
-# ----------------------------------------------------------------------
-
-# ----------------------------------------------------------------------
-@dataclasses.dataclass(frozen=True, )
-@functools.total_ordering
-class Label:
-    """動的計画法の段階(グラフの頂点)に付与されるラベル"""
-    vertex_this: Vertex
-    label_prev: Label | None
-    cumulative_time: float
-
-    @property
-    # heapq の大小比較の仕様の都合上、累計タイムに -1 をかけたものを用意
-    def __minus_times_cumulative_time(self) -> float:
-        return -1 * self.cumulative_time
-
-    # heapq の大小比較の仕様の都合上、累計タイムに -1 をかけたものを第1優先にして比較
-    def __lt__(self, other) -> bool:
-        if isinstance(other, Label):
-            if self.__minus_times_cumulative_time < other.__minus_times_cumulative_time:
-                return True
-            elif self.__minus_times_cumulative_time == other.__minus_times_cumulative_time:
-                if self.vertex_this < other.vertex_this:
-                    return True
-                elif self.vertex_this == other.vertex_this:
-                    if self.label_prev == other.label_prev:
-                        return False
-                    elif self.label_prev is None:
-                        return True
-                    elif other.label_prev is None:
-                        return False
-                    elif self.label_prev < other.label_prev:
-                        return True
-                    else:
-                        return False
-                else:
-                    return False
-            else:
-                return False
-        return False
-
-    def __eq__(self, other) -> bool:
-        if isinstance(other, Label):
-            return self.__dict__ == other.__dict__
-        return False
-
-    def __hash__(self):
-        return hash(tuple(sorted(self.__dict__.items())))
-
-    def __repr_label_prev(self) -> str:
-        return (
-            'None' if self.label_prev is None else (
-                f'({self.label_prev.vertex_this}, ' +
-                f'{self.label_prev.cumulative_time:.2f})'
-            )
-        )
-
-    def __repr__(self) -> str:
-        return (
-            f'vt={self.vertex_this}, ' +
-            f'lp={self.__repr_label_prev()}, ' +
-            f'ct={self.cumulative_time:.2f}'
-        )
-# ----------------------------------------------------------------------
-
-# ----------------------------------------------------------------------
-@dataclasses.dataclass(frozen=True, )
-class OptimizerByDynamicProgramming:
-    """
-    動的計画法(今回の場合、非巡回有向グラフに対するダイクストラ法)によるチャートの最適化
-
-    Parameters
-    ----------
-    levels : list[Level]
-        (手前の面から並んだ)面のリスト
-    max_labels_per_vertex : int
-        求めたいチャートの個数（ 第 1 最適 ～ 最大で 第 max_labels_per_vertex 最適 まで）
-    max_required_gems : int
-        開放に必要なダイヤ数が最も多い面の必要ダイヤ数
-    """
-    levels: list[Level]
-    max_labels_per_vertex: int
-    max_required_gems: int = dataclasses.field(compare=False)
-    # 値のデータ構造が list だが、 操作には heapq を使用する
-    __labels: dict[Vertex, list[Label]] = dataclasses.field(
-        init=False, default_factory=dict, compare=False,
-    )
-
-    def solve(self) -> list[tuple[list[Vertex], float]]:
-        """チャートを求める"""
-        # 最初の頂点たちにラベルを付与する
-        for cumulative_num_gems, cumulative_time in self.levels[0].times.items():
-            vertex_start: Vertex = Vertex(self.levels[0], cumulative_num_gems)
-            self.__labels[vertex_start] = [
-                Label(vertex_start, None, cumulative_time)
-            ]
-
-        # (面, ダイヤ数) を辞書式の順番で探索
-        for level in self.levels:
-            for cumulative_num_gems in range(0, self.max_required_gems + 1):
-                vertex_this: Vertex = Vertex(level, cumulative_num_gems)
-                # この頂点にラベルがない(入ってくる枝がない)場合
-                if vertex_this not in self.__labels.keys():
-                    continue
-                # この頂点の各ラベルについて
-                for label_this in self.__labels[vertex_this]:
-                    # 次に移動できる面と移動時間について
-                    for level_next, time_move in vertex_this.level.get_next_levels_and_times().items():
-                        # この頂点でのダイヤ数が足りず次に移動できる面を開放できない場合
-                        if vertex_this.cumlative_num_gems < level_next.num_required_gems:
-                            continue
-                        # 次に移動した面で取得するダイヤ数とクリア時間について
-                        for num_gems_next, time_next in level_next.times.items():
-                            # ダイヤ数 = この頂点のダイヤ数 + 次に移動した面で取得するダイヤ数
-                            cumlative_num_gems_next: int = vertex_this.cumlative_num_gems + num_gems_next
-                            # ダイヤ数を必要以上に取った場合
-                            if cumlative_num_gems_next > self.max_required_gems:
-                                continue
-                            #
-                            # 時間 = この頂点までの累積時間 + 次に移動した面への移動時間 + 次に移動した面のクリア時間
-                            cumulative_time_next: float = label_this.cumulative_time + time_move + time_next
-                            #
-                            # (次に移動した面, ダイヤ数) の頂点 のラベルたちとの比較
-                            vertex_next: Vertex = Vertex(level_next, cumlative_num_gems_next)
-                            # ラベルがない場合
-                            if vertex_next not in self.__labels.keys():
-                                self.__labels[vertex_next] = []
-                                heapq.heappush(
-                                    self.__labels[vertex_next],
-                                    Label(vertex_next, label_this, cumulative_time_next)
-                                )
-                            # ラベルがあるが最大数以下の個数しかない場合
-                            elif len(self.__labels[vertex_next]) < self.max_labels_per_vertex:
-                                heapq.heappush(
-                                    self.__labels[vertex_next],
-                                    Label(vertex_next, label_this, cumulative_time_next)
-                                )
-                            # ラベルがあり最大個数に達している場合
-                            else:
-                                # 時間が累積時間が最も長いラベルの時間より短い場合
-                                # ( heapq と Label の大小比較の実装により、 self.__labels[vertex_next][0] は累積時間が最も長いラベルとなっている)
-                                if cumulative_time_next < self.__labels[vertex_next][0].cumulative_time:
-                                    heapq.heappushpop(
-                                        self.__labels[vertex_next],
-                                        Label(vertex_next, label_this, cumulative_time_next)
-                                    )
-                                # そうでない場合
-                                else:
-                                    pass
-
-        # (最終面, 最小必要ダイヤ数) の各ラベルからグラフを逆にたどってパスを構築
-        strategies: list[tuple[list[Vertex], float]] = []
-        vertex_stop: Vertex = Vertex(self.levels[-1], self.max_required_gems)
-        for label_stop in sorted(self.__labels[vertex_stop], key=lambda x: x.cumulative_time):
-            vertices: list[Vertex] = [vertex_stop]
-            #
-            label_this: Label = label_stop
-            while label_this.label_prev is not None:
-                label_this = label_this.label_prev
-                vertices.append(label_this.vertex_this)
-            #
-            vertices.reverse()
-            strategies.append((vertices, label_stop.cumulative_time))
-
-        return strategies
-
-    def __repr_labels(self, labels: list[Label]) -> str:
-        return "', '".join([str(l) for l in labels])
-
-    def __repr__(self) -> str:
-        s: str = ''
-        s += f'levels=\n'
-        s += f'\n'.join([str(l) for l in self.levels]) + '\n'
-        s += f'mlpv={self.max_labels_per_vertex}\n'
-        s += f'lables='
-        if len(self.__labels) > 0:
-            s += '\n' + f'\n'.join([
-                f"{v}: ['{self.__repr_labels(ls)}']"
-                for v, ls in self.__labels.items()
-            ]) + '\n'
-        else:
-            s += '(Empty)'
-        return s
-# ----------------------------------------------------------------------
-# -----------------------------------------------------------------------------
+# Project
+# -----------------------------------------------------------------------------
+# Title   : Dynamic Programming for Optimal Speedrun Strategy Exploration
+# Author  : [Twitter] @samuelladoco  [Twitch] SLDCtwitch
+# Contents: Dynamic programming algorithm (Dijkstra's algorithm for DAG)
+# -----------------------------------------------------------------------------
+
+
+# Import
+# -----------------------------------------------------------------------------
+from __future__ import annotations
+import array
+import contextlib
+import dataclasses
+import heapq
+import math
+import pathlib
+import sys
+import time
+from typing import Any, Callable, ClassVar, Hashable, Iterator
+import numpy as np
+#
+from instance import CompiledInstance
+from level import Level
+# -----------------------------------------------------------------------------
+
+
+# Classes
+# -----------------------------------------------------------------------------
+# ----------------------------------------------------------------------
+@dataclasses.dataclass(frozen=True, order=True, )
+class Vertex:
+    """動的計画法の段階(グラフの頂点)"""
+    level: Level
+    cumlative_num_gems: int
+
+    def __repr__(self) -> str:
+        return f'({self.level.ep_pg}, {self.cumlative_num_gems})'
+# ----------------------------------------------------------------------
+
+# ----------------------------------------------------------------------
+@dataclasses.dataclass(eq=False, )
+class Label:
+    """
+    動的計画法の段階(グラフの頂点)に付与されるラベル
+
+    直前のラベルはオブジェクトではなく、全ラベルの配列における添字で保持する
+
+    Parameters
+    ----------
+    cumulative_time : float
+        累積時間
+    vertex_id : int
+        このラベルが付与された頂点の番号
+    label_prev_id : int
+        直前のラベルの番号(ない場合は -1 )
+    sequence_number : int
+        このラベルの番号(作られた順の通し番号で、全ラベルの配列における添字)
+    """
+    __slots__ = (
+        'cumulative_time', 'vertex_id', 'label_prev_id', 'sequence_number',
+    )
+    cumulative_time: float
+    vertex_id: int
+    label_prev_id: int
+    sequence_number: int
+
+    # heapq の大小比較の仕様の都合上、(累計タイム, 通し番号) が大きいものほど小さいとして比較
+    # (累積時間が最も長く、同じ場合は後から作られたラベルが heapq の先頭になる)
+    def __lt__(self, other: Label) -> bool:
+        return (
+            (other.cumulative_time, other.sequence_number) <
+            (self.cumulative_time, self.sequence_number)
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f'id={self.sequence_number}, ' +
+            f'vt={self.vertex_id}, ' +
+            f'lp={self.label_prev_id}, ' +
+            f'ct={self.cumulative_time:.2f}'
+        )
+# ----------------------------------------------------------------------
+
+# ----------------------------------------------------------------------
+@dataclasses.dataclass(eq=False, )
+class LabelArena:
+    """
+    ラベルの (頂点の番号, 直前のラベルの番号) だけを通し番号の順に保持する配列(省メモリモードでパスの構築に使う)
+
+    Label オブジェクトの代わりに 1 ラベルあたり 16 バイトの整数の配列で保持する。
+    spill_path が None でない場合、 chunk_size 個ごとにファイルに追記し、書き出した分はメモリマップで読む
+
+    Parameters
+    ----------
+    spill_path : pathlib.Path | None
+        書き出し先のファイル(既存のファイルは上書きされ、 remove_spilled() で削除される)
+    chunk_size : int
+        ファイルに書き出す単位のラベルの個数
+    """
+    spill_path: pathlib.Path | None = None
+    chunk_size: int = 1 << 20
+    # メモリ上の (頂点の番号, 直前のラベルの番号) の並び
+    __buffer: array.array = dataclasses.field(
+        init=False, default_factory=lambda: array.array('q'),
+    )
+    # ファイルに書き出したラベルの個数と、そのメモリマップ(書き出すたびに開き直す)
+    __num_spilled: int = dataclasses.field(init=False, default=0)
+    __spilled: np.ndarray | None = dataclasses.field(init=False, default=None)
+    # 書き出したファイルを削除したか
+    __removed: bool = dataclasses.field(init=False, default=False)
+
+    def __len__(self) -> int:
+        return self.__num_spilled + len(self.__buffer) // 2
+
+    @property
+    def nbytes_in_memory(self) -> int:
+        """メモリ上に保持しているバイト数"""
+        return len(self.__buffer) * self.__buffer.itemsize
+
+    @property
+    def nbytes_spilled(self) -> int:
+        """ファイルに書き出したバイト数"""
+        return self.__num_spilled * 2 * self.__buffer.itemsize
+
+    def append(self, vertex_id: int, label_prev_id: int) -> int:
+        """ラベルを加え、その通し番号を返す"""
+        label_id: int = len(self)
+        self.__buffer.append(vertex_id)
+        self.__buffer.append(label_prev_id)
+        if self.spill_path is not None and len(self.__buffer) >= 2 * self.chunk_size:
+            self.__spill()
+        return label_id
+
+    def get(self, label_id: int) -> tuple[int, int]:
+        """通し番号が label_id のラベルの (頂点の番号, 直前のラベルの番号) を取得する"""
+        if label_id >= self.__num_spilled:
+            index: int = 2 * (label_id - self.__num_spilled)
+            return self.__buffer[index], self.__buffer[index + 1]
+        assert self.spill_path is not None
+        assert self.__removed is False, f'{self.spill_path} は削除済みです'
+        if self.__spilled is None:
+            self.__spilled = np.memmap(
+                self.spill_path, dtype=np.int64, mode='r', shape=(self.__num_spilled, 2),
+            )
+        return int(self.__spilled[label_id, 0]), int(self.__spilled[label_id, 1])
+
+    def __spill(self) -> None:
+        """メモリ上のラベルをファイルに追記する"""
+        assert self.spill_path is not None
+        with open(self.spill_path, 'ab' if self.__num_spilled > 0 else 'wb') as f:
+            self.__buffer.tofile(f)
+        self.__num_spilled += len(self.__buffer) // 2
+        self.__buffer = array.array('q')
+        self.__spilled = None
+
+    def remove_spilled(self) -> None:
+        """書き出したファイルを削除する(書き出したラベルは取得できなくなるが、個数とバイト数は残る)"""
+        if self.spill_path is None or self.__num_spilled == 0 or self.__removed:
+            return
+        # (メモリマップを閉じてから削除する)
+        self.__spilled = None
+        self.spill_path.unlink(missing_ok=True)
+        self.__removed = True
+# ----------------------------------------------------------------------
+
+# ----------------------------------------------------------------------
+@dataclasses.dataclass(eq=False, )
+class SolverStats:
+    """
+    ラベルの探索の統計( OptimizerByDynamicProgramming の collect_stats が True の場合に集計する)
+
+    Parameters
+    ----------
+    num_relaxations : int
+        ラベルを延ばして作った候補の個数(以下の num_pushes ～ num_unreachable の合計)
+    num_pushes : int
+        候補をラベルとして加えた回数(移動先の頂点のラベルが最大個数未満の場合)
+    num_replacements : int
+        候補で累積時間が最も長いラベルを置き換えた回数
+    num_rejections : int
+        候補の累積時間が最も長いラベル以上のため捨てた回数
+    num_pruned : int
+        候補を残り時間の下界により枝刈りした回数
+    num_unreachable : int
+        候補の移動先の頂点から最終面まで到達できないため捨てた回数
+    num_labels_skipped : int
+        延ばす前に残り時間の下界により枝刈りしたラベルの個数
+    seconds_total : float
+        探索にかかった時間
+    seconds_per_level : list[float]
+        面ごとの、その面の頂点からの探索にかかった時間
+    relaxations_per_level : list[int]
+        面ごとの、その面の頂点から延ばした候補の個数
+    relaxations_per_gem_row : list[int]
+        累計ダイヤ数ごとの、その累計ダイヤ数の頂点から延ばした候補の個数
+    """
+    num_relaxations: int = 0
+    num_pushes: int = 0
+    num_replacements: int = 0
+    num_rejections: int = 0
+    num_pruned: int = 0
+    num_unreachable: int = 0
+    num_labels_skipped: int = 0
+    seconds_total: float = 0.0
+    seconds_per_level: list[float] = dataclasses.field(default_factory=list)
+    relaxations_per_level: list[int] = dataclasses.field(default_factory=list)
+    relaxations_per_gem_row: list[int] = dataclasses.field(default_factory=list)
+
+    def to_dict(self) -> dict[str, Any]:
+        """JSON に変換できる辞書にする"""
+        return dataclasses.asdict(self)
+# ----------------------------------------------------------------------
+
+# ----------------------------------------------------------------------
+@dataclasses.dataclass(frozen=True, )
+class OptimizerByDynamicProgramming:
+    """
+    動的計画法(今回の場合、非巡回有向グラフに対するダイクストラ法)によるチャートの最適化
+
+    頂点は、最初の面から到達でき最終面まで到達できる (面, ダイヤ数) だけに絞った CompiledInstance の状態の番号で表す
+
+    Parameters
+    ----------
+    instance : CompiledInstance
+        配列に変換したインスタンス
+    max_labels_per_vertex : int
+        求めたいチャートの個数（ 第 1 最適 ～ 最大で 第 max_labels_per_vertex 最適 まで）
+    prune_by_lower_bounds : bool
+        逆向きの動的計画法で求めた残り時間の下界により、上位のチャートになり得ないラベルを枝刈りするか
+    bound_memory : bool
+        省メモリモード。頂点から探索し終えたらその頂点のラベルを捨て(最終頂点を除く)、
+        パスの構築に必要な (頂点の番号, 直前のラベルの番号) だけを LabelArena に保持する( resolve() は使えない)
+    spill_path : pathlib.Path | None
+        省メモリモードで、 LabelArena をこのファイルに書き出してメモリマップで読む
+        (ファイルは solve() と solve_from() がチャートを構築した後に削除するため、その後 get_strategies() は使えない)
+    collect_stats : bool
+        ラベルの探索の統計( SolverStats )を集計するか( get_stats() で取得する)
+    profiler : Any
+        None でない場合、ラベルの探索をこのコンテキストマネージャー(例えば cProfile.Profile() )の中で実行する
+    route_token : Callable[[Level], Hashable] | None
+        None でない場合、経路(通った面の route_token の値の列)が異なるチャートを求める。
+        頂点ごとに経路が同じラベルは累積時間が最も短い 1 個だけを保持し(ダイヤ数の取り方だけが異なるチャートを除き)、
+        最大 max_labels_per_vertex 個の異なる経路を保持する(例えば面の (エピソード番号, ページ番号) とすると面の列が異なるチャート)。
+        prune_by_lower_bounds と併用する場合は面ごとに異なる値でなければならない( iter_strategies() は使えない)
+    """
+    # 累積時間の比較で丸め誤差とみなす差
+    _time_tolerance: ClassVar[float] = 1e-6
+    instance: CompiledInstance
+    max_labels_per_vertex: int
+    prune_by_lower_bounds: bool = dataclasses.field(default=False, compare=False)
+    bound_memory: bool = dataclasses.field(default=False, compare=False)
+    spill_path: pathlib.Path | None = dataclasses.field(default=None, compare=False)
+    collect_stats: bool = dataclasses.field(default=False, compare=False)
+    profiler: Any = dataclasses.field(default=None, compare=False)
+    route_token: Callable[[Level], Hashable] | None = dataclasses.field(default=None, compare=False)
+    # 作られた全てのラベル(添字はラベルの通し番号)(省メモリモードでは使わない)
+    __labels_all: list[Label] = dataclasses.field(
+        init=False, default_factory=list, compare=False,
+    )
+    # 省メモリモードで、作られた全てのラベルの (頂点の番号, 直前のラベルの番号)
+    __arena: LabelArena = dataclasses.field(
+        init=False, default_factory=LabelArena, compare=False,
+    )
+    # 生きている(いずれかの頂点が保持している)ラベルの個数の最大値
+    __peak_num_live_labels: list[int] = dataclasses.field(
+        init=False, default_factory=lambda: [0], compare=False,
+    )
+    # 省メモリモードで、頂点からの探索を終えるたびに測った (生きているラベルと LabelArena のメモリ上のバイト数) の最大値
+    __peak_bytes: list[int] = dataclasses.field(
+        init=False, default_factory=lambda: [0], compare=False,
+    )
+    # 頂点の番号をキーとする。値のデータ構造が list だが、 操作には heapq を使用する
+    __labels: dict[int, list[Label]] = dataclasses.field(
+        init=False, default_factory=dict, compare=False,
+    )
+    # 経路を区別する場合の、 (直前の経路の番号, 面の route_token の値) をキーとする経路の番号
+    __routes: dict[tuple[int, Hashable], int] = dataclasses.field(
+        init=False, default_factory=dict, compare=False,
+    )
+    # 経路を区別する場合の、作られた全てのラベルの経路の番号(添字はラベルの通し番号)
+    __label_routes: array.array = dataclasses.field(
+        init=False, default_factory=lambda: array.array('q'), compare=False,
+    )
+    # 経路を区別する場合の、頂点の番号をキーとする、経路の番号からその経路のラベルへの辞書
+    __route_labels: dict[int, dict[int, Label]] = dataclasses.field(
+        init=False, default_factory=dict, compare=False,
+    )
+    # ラベルの探索の統計
+    __stats: SolverStats = dataclasses.field(
+        init=False, default_factory=SolverStats, compare=False,
+    )
+
+    def __post_init__(self) -> None:
+        assert self.spill_path is None or self.bound_memory, (
+            f'spill_path は省メモリモードでのみ使えます'
+        )
+        if self.spill_path is not None:
+            self.__arena.spill_path = pathlib.Path(self.spill_path)
+        # 同じ面の異なる経路が最終面まで異なる経路のままであることを、下界による枝刈りで使う
+        assert self.route_token is None or self.prune_by_lower_bounds is False or (
+            len({self.route_token(l) for l in self.levels}) == len(self.levels)
+        ), f'下界による枝刈りと併用する場合、 route_token は面ごとに異なる値でなければなりません'
+
+    @property
+    def levels(self) -> list[Level]:
+        """(手前の面から並んだ)面のリスト"""
+        return self.instance.levels
+
+    @property
+    def max_required_gems(self) -> int:
+        """開放に必要なダイヤ数が最も多い面の必要ダイヤ数"""
+        return self.instance.max_required_gems
+
+    def get_memory_usage(self) -> dict[str, int]:
+        """
+        solve() でのラベルのメモリ使用量を取得する
+
+        num_labels: 作られたラベルの個数、
+        peak_live_labels: 同時に生きていた Label オブジェクトの個数の最大値、
+        arena_bytes / arena_bytes_spilled: 終了時の LabelArena のメモリ上 / ファイルのバイト数、
+        estimated_peak_bytes: Label オブジェクト(とそれを指すリストの要素)と LabelArena のメモリ上のバイト数の和の最大値の見積もり
+        (省メモリモードでは頂点からの探索を終えるたびに測った和の最大値で、ファイルに書き出した分は含まない)
+        """
+        num_labels: int = len(self.__arena) if self.bound_memory else len(self.__labels_all)
+        # 省メモリモードでない場合は、全てのラベルが全ラベルの配列から参照され続ける
+        peak_live_labels: int = (
+            self.__peak_num_live_labels[0] if self.bound_memory else num_labels
+        )
+        return {
+            'num_labels': num_labels,
+            'peak_live_labels': peak_live_labels,
+            'arena_bytes': self.__arena.nbytes_in_memory,
+            'arena_bytes_spilled': self.__arena.nbytes_spilled,
+            'estimated_peak_bytes': (
+                self.__peak_bytes[0] if self.bound_memory else num_labels * self.__get_bytes_per_label()
+            ),
+        }
+
+    def get_stats(self) -> SolverStats:
+        """ラベルの探索の統計を取得する( collect_stats が True の場合のみ集計される)"""
+        return self.__stats
+
+    def solve(self) -> list[tuple[list[Vertex], float]]:
+        """チャートを求める"""
+        self.__label_first_vertices()
+        self.__relax(0)
+        return self.__get_strategies_and_remove_spilled()
+
+    def solve_from(self,
+            vertex_start: Vertex,
+            elapsed_time: float = 0.0,
+            ) -> list[tuple[list[Vertex], float]]:
+        """
+        途中の頂点から最終面までのチャートを求める(走行中の計画の立て直し用で、 solve() の代わりに呼ぶ)
+
+        vertex_start の面をクリアした時点の累積時間を elapsed_time として、 vertex_start から到達できる頂点だけを探索する。
+        チャートの頂点のリストは vertex_start から始まり、時間は elapsed_time を含む。
+        max_labels_per_vertex が 1 の場合はインスタンスが保持する残り時間の表( CompiledInstance.costs_to_go )をたどるだけで求め
+        (ラベルを作らないため、統計とメモリ使用量は 0 のまま)、
+        2 以上の場合は vertex_start だけにラベルを付与して前向きの動的計画法を実行する
+        (統計とメモリ使用量は solve() と同様にこのオブジェクトから取得できる)
+
+        Parameters
+        ----------
+        vertex_start : Vertex
+            最後にクリアした面と、その時点のダイヤ数
+        elapsed_time : float
+            vertex_start の面をクリアした時点の累積時間(動的計画法で使う単位)
+        """
+        assert len(self.__labels) == 0, f'solve() または solve_from() の実行後は求められません'
+        level_start_id: int = self.instance.get_level_id(vertex_start.level.ep_pg)
+        assert 0 <= vertex_start.cumlative_num_gems <= self.max_required_gems, (
+            f'ダイヤ数 {vertex_start.cumlative_num_gems} は 0 以上 {self.max_required_gems} 以下ではありません'
+        )
+        vertex_start_id: int = int(
+            self.instance.state_ids[level_start_id, vertex_start.cumlative_num_gems]
+        )
+        # 最終面まで到達できない場合
+        if vertex_start_id < 0:
+            return []
+        if self.max_labels_per_vertex == 1:
+            return [self.__follow_costs_to_go(level_start_id, vertex_start, elapsed_time)]
+        self.__label_start_vertex(vertex_start_id, level_start_id, elapsed_time)
+        # 手前の面にはラベルがないため、 vertex_start の面以降だけを探索すればよい
+        self.__relax(level_start_id)
+        return self.__get_strategies_and_remove_spilled()
+
+    def resolve(self,
+            level_times: dict[tuple[tuple[int, int], int], float] | None = None,
+            move_times: dict[tuple[tuple[int, int], tuple[int, int]], float] | None = None,
+            ) -> OptimizerByDynamicProgramming:
+        """
+        クリア時間と移動時間の一部を変更して解き直した最適化オブジェクトを返す(このオブジェクトは変更しない)
+
+        solve() 済みのラベルのうち、変更の影響を受ける最も手前の面より手前の面のラベルはそのまま使い、
+        それ以降の面のラベルだけを求め直す( prune_by_lower_bounds が True の場合はラベルを引き継がず、全ての面のラベルを求め直す)。
+        結果は変更後のインスタンスで solve() した場合と一致する。
+        チャートは返したオブジェクトの get_strategies() で取得する。
+
+        Parameters
+        ----------
+        level_times : dict[tuple[tuple[int, int], int], float] | None
+            ((エピソード番号, ページ番号), ダイヤ取得数) をキーとする変更後のクリア時間
+        move_times : dict[tuple[tuple[int, int], tuple[int, int]], float] | None
+            (移動元の (エピソード番号, ページ番号), 移動先の (エピソード番号, ページ番号)) をキーとする変更後の移動時間
+        """
+        assert len(self.__labels) > 0, f'solve() の実行前は解き直せません'
+        assert self.bound_memory is False, f'省メモリモードでは解き直せません'
+        instance_new, level_id_changed = self.instance.with_times(level_times, move_times)
+        # 下界による枝刈りをした場合、変更前のラベルは変更前の下界と上限で枝刈りされており、
+        # 変更後に上位のチャートになり得るラベルが欠けていることがあるため、最初の面から解き直す
+        if self.prune_by_lower_bounds:
+            level_id_changed = 0
+        opt_new: OptimizerByDynamicProgramming = OptimizerByDynamicProgramming(
+            instance_new, self.max_labels_per_vertex, self.prune_by_lower_bounds,
+            collect_stats=self.collect_stats, profiler=self.profiler,
+            route_token=self.route_token,
+        )
+        opt_new.__inherit_labels(self, level_id_changed)
+        if level_id_changed == 0:
+            opt_new.__label_first_vertices()
+        opt_new.__relax(level_id_changed)
+        return opt_new
+
+    def get_strategies(self) -> list[tuple[list[Vertex], float]]:
+        """求めたラベルからチャートを構築する"""
+        # (最終面, 最小必要ダイヤ数) の各ラベルから直前のラベルの番号を逆にたどってパスを構築
+        strategies: list[tuple[list[Vertex], float]] = []
+        vertex_stop_id: int = int(self.instance.state_ids[-1, -1])
+        for label_stop in sorted(
+                self.__labels.get(vertex_stop_id, []),
+                key=lambda x: (x.cumulative_time, x.sequence_number)):
+            vertices: list[Vertex] = []
+            #
+            label_id: int = label_stop.sequence_number
+            while label_id >= 0:
+                vertex_id: int
+                if self.bound_memory:
+                    vertex_id, label_id = self.__arena.get(label_id)
+                else:
+                    label_this: Label = self.__labels_all[label_id]
+                    vertex_id, label_id = label_this.vertex_id, label_this.label_prev_id
+                vertices.append(self.__get_vertex(vertex_id))
+            #
+            vertices.reverse()
+            strategies.append((vertices, label_stop.cumulative_time))
+
+        return strategies
+
+    def __get_strategies_and_remove_spilled(self) -> list[tuple[list[Vertex], float]]:
+        """チャートを構築し、 LabelArena を書き出したファイルを(構築に失敗した場合も)削除する"""
+        try:
+            return self.get_strategies()
+        finally:
+            self.__arena.remove_spilled()
+
+    def __label_first_vertices(self) -> None:
+        """最初の頂点たちにラベルを付与する"""
+        for cumulative_num_gems, cumulative_time in self.instance.get_gems_and_times()[0]:
+            if cumulative_num_gems > self.max_required_gems:
+                continue
+            vertex_start_id: int = int(self.instance.state_ids[0, cumulative_num_gems])
+            # 最終面まで到達できない場合
+            if vertex_start_id < 0:
+                continue
+            self.__label_start_vertex(vertex_start_id, 0, cumulative_time)
+
+    def __label_start_vertex(self,
+            vertex_start_id: int, level_start_id: int, cumulative_time: float,
+            ) -> None:
+        """最初の頂点(直前のラベルがない頂点)にラベルを付与する"""
+        if self.route_token is None:
+            self.__labels[vertex_start_id] = [
+                self.__create_label(cumulative_time, vertex_start_id, -1)
+            ]
+            return
+        route_id: int = self.__routes.setdefault(
+            (-1, self.route_token(self.levels[level_start_id])), len(self.__routes),
+        )
+        label: Label = self.__create_label(cumulative_time, vertex_start_id, -1, route_id)
+        self.__labels[vertex_start_id] = [label]
+        self.__route_labels[vertex_start_id] = {route_id: label}
+
+    def __follow_costs_to_go(self,
+            level_id: int, vertex_start: Vertex, elapsed_time: float,
+            ) -> tuple[list[Vertex], float]:
+        """
+        vertex_start から、残り時間の表で残り時間が最短となる次の頂点を順にたどって第 1 最適のチャートを構築する
+        (残り時間が同じ次の頂点が複数ある場合は、移動先の面とダイヤ数が手前のものを選ぶ)
+        """
+        max_required_gems: int = self.max_required_gems
+        costs_to_go: np.ndarray = self.instance.costs_to_go
+        gems_and_times: list[list[tuple[int, float]]] = self.instance.get_gems_and_times()
+        moves: list[list[tuple[int, float, int]]] = self.instance.get_moves()
+        level_stop_id: int = self.instance.num_levels - 1
+        #
+        vertices: list[Vertex] = [vertex_start]
+        cumulative_num_gems: int = vertex_start.cumlative_num_gems
+        cumulative_time: float = elapsed_time
+        while level_id != level_stop_id:
+            # (次の頂点の残り時間を含めた時間, 次に移動した面, ダイヤ数, 移動時間 + クリア時間)
+            best: tuple[float, int, int, float] | None = None
+            for level_next_id, time_move, num_required_gems in moves[level_id]:
+                if cumulative_num_gems < num_required_gems:
+                    continue
+                for num_gems_next, time_next in gems_and_times[level_next_id]:
+                    cumlative_num_gems_next: int = cumulative_num_gems + num_gems_next
+                    if cumlative_num_gems_next > max_required_gems:
+                        break
+                    time_total: float = (
+                        time_move + time_next +
+                        float(costs_to_go[level_next_id, cumlative_num_gems_next])
+                    )
+                    if best is None or time_total < best[0]:
+                        best = (time_total, level_next_id, cumlative_num_gems_next, time_move + time_next)
+            # 残り時間が有限の頂点からは、残り時間が有限の次の頂点が必ずある
+            assert best is not None
+            _, level_id, cumulative_num_gems, time_step = best
+            cumulative_time += time_step
+            vertices.append(Vertex(self.levels[level_id], cumulative_num_gems))
+        return vertices, cumulative_time
+
+    def __relax(self, level_id_changed: int) -> None:
+        """
+        (面, ダイヤ数) を辞書式の順番で探索し、ラベルを付与する
+
+        面の番号が level_id_changed より手前の頂点のラベルは付与済みとし、
+        それらからは level_id_changed 以降の面への移動だけを探索する
+        """
+        with self.profiler if self.profiler is not None else contextlib.nullcontext():
+            self.__relax_labels(level_id_changed)
+
+    def __relax_labels(self, level_id_changed: int) -> None:
+        """__relax() の本体"""
+        max_required_gems: int = self.max_required_gems
+        gems_and_times: list[list[tuple[int, float]]] = self.instance.get_gems_and_times()
+        moves: list[list[tuple[int, float, int]]] = [
+            [m for m in ms if level_id >= level_id_changed or m[0] >= level_id_changed]
+            for level_id, ms in enumerate(self.instance.get_moves())
+        ]
+        state_offsets: list[int] = self.instance.state_offsets.tolist()
+        state_gems: list[int] = self.instance.state_gems.tolist()
+        state_ids: list[list[int]] = self.instance.state_ids.tolist()
+        vertex_stop_id: int = int(self.instance.state_ids[-1, -1])
+        # 生きているラベルの個数と1個あたりのバイト数(省メモリモードでメモリ使用量を報告するため)
+        num_live_labels: int = sum(len(ls) for ls in self.__labels.values())
+        bytes_per_label: int = self.__get_bytes_per_label()
+        # 経路を区別する場合の各面の route_token の値
+        level_tokens: list[Hashable] | None = (
+            None if self.route_token is None else [self.route_token(l) for l in self.levels]
+        )
+
+        # 下界による枝刈りのための各頂点からの残り時間の下界と、累積時間の上限
+        # (枝刈りしない場合は下界を 0 とし、上限は inf のまま更新しない)
+        # (最終面まで到達できない頂点は状態に含まれないため、下界は常に有限)
+        costs_to_go: list[float] = (
+            self.instance.get_state_costs_to_go() if self.prune_by_lower_bounds
+            else [0.0] * self.instance.num_states
+        )
+        time_threshold: float = math.inf
+
+        # 統計のための候補の個数(常に数えるが、 SolverStats に書き込むのは collect_stats が True の場合のみ)
+        num_pushes: int = 0
+        num_replacements: int = 0
+        num_rejections: int = 0
+        num_pruned: int = 0
+        num_unreachable: int = 0
+        num_labels_skipped: int = 0
+        stats: SolverStats = self.__stats
+        if self.collect_stats:
+            stats.seconds_per_level = [0.0] * self.instance.num_levels
+            stats.relaxations_per_level = [0] * self.instance.num_levels
+            stats.relaxations_per_gem_row = [0] * (max_required_gems + 1)
+        time_start: float = time.perf_counter()
+
+        # (面, ダイヤ数) を辞書式の順番で探索
+        for level_id in range(self.instance.num_levels):
+            time_level_start: float = time.perf_counter()
+            # この面のラベルは確定しているので、第 max_labels_per_vertex 最適のチャートの累積時間の上限を更新する
+            if self.prune_by_lower_bounds:
+                time_threshold = min(
+                    time_threshold,
+                    self.__compute_time_upper_bound(level_id, costs_to_go),
+                )
+            # この面から探索する移動がない場合
+            if len(moves[level_id]) == 0:
+                continue
+            for vertex_this_id in range(state_offsets[level_id], state_offsets[level_id + 1]):
+                cumulative_num_gems: int = state_gems[vertex_this_id]
+                labels_this: list[Label] | None = self.__labels.get(vertex_this_id)
+                # この頂点にラベルがない(入ってくる枝がない)場合
+                if labels_this is None:
+                    continue
+                cost_to_go_this: float = costs_to_go[vertex_this_id]
+                # この頂点の各ラベルについて
+                for label_this in labels_this:
+                    # 残り時間の下界を足すと上限を超える場合
+                    if label_this.cumulative_time + cost_to_go_this > time_threshold:
+                        num_labels_skipped += 1
+                        continue
+                    route_this_id: int = (
+                        -1 if level_tokens is None else self.__label_routes[label_this.sequence_number]
+                    )
+                    # 次に移動できる面と移動時間について
+                    for level_next_id, time_move, num_required_gems in moves[level_id]:
+                        # この頂点でのダイヤ数が足りず次に移動できる面を開放できない場合
+                        if cumulative_num_gems < num_required_gems:
+                            continue
+                        # 次に移動した面で取得するダイヤ数とクリア時間について
+                        for num_gems_next, time_next in gems_and_times[level_next_id]:
+                            # ダイヤ数 = この頂点のダイヤ数 + 次に移動した面で取得するダイヤ数
+                            cumlative_num_gems_next: int = cumulative_num_gems + num_gems_next
+                            # ダイヤ数を必要以上に取った場合(以降の取得ダイヤ数はさらに多い)
+                            if cumlative_num_gems_next > max_required_gems:
+                                break
+                            #
+                            # 時間 = この頂点までの累積時間 + 次に移動した面への移動時間 + 次に移動した面のクリア時間
+                            cumulative_time_next: float = label_this.cumulative_time + time_move + time_next
+                            #
+                            # (次に移動した面, ダイヤ数) の頂点 のラベルたちとの比較
+                            vertex_next_id: int = state_ids[level_next_id][cumlative_num_gems_next]
+                            # 最終面まで到達できない場合
+                            if vertex_next_id < 0:
+                                num_unreachable += 1
+                                continue
+                            # 残り時間の下界を足すと上限を超える場合
+                            if cumulative_time_next + costs_to_go[vertex_next_id] > time_threshold:
+                                num_pruned += 1
+                                continue
+                            # 経路を区別する場合
+                            if level_tokens is not None:
+                                outcome: int = self.__relax_route_label(
+                                    vertex_next_id,
+                                    (route_this_id, level_tokens[level_next_id]),
+                                    cumulative_time_next, label_this.sequence_number,
+                                )
+                                if outcome == 0:
+                                    num_live_labels += 1
+                                    num_pushes += 1
+                                elif outcome == 1:
+                                    num_replacements += 1
+                                else:
+                                    num_rejections += 1
+                                continue
+                            labels_next: list[Label] | None = self.__labels.get(vertex_next_id)
+                            # ラベルがない場合
+                            if labels_next is None:
+                                self.__labels[vertex_next_id] = [
+                                    self.__create_label(
+                                        cumulative_time_next, vertex_next_id,
+                                        label_this.sequence_number,
+                                    )
+                                ]
+                                num_live_labels += 1
+                                num_pushes += 1
+                            # ラベルがあるが最大数以下の個数しかない場合
+                            elif len(labels_next) < self.max_labels_per_vertex:
+                                heapq.heappush(
+                                    labels_next,
+                                    self.__create_label(
+                                        cumulative_time_next, vertex_next_id,
+                                        label_this.sequence_number,
+                                    )
+                                )
+                                num_live_labels += 1
+                                num_pushes += 1
+                            # ラベルがあり最大個数に達している場合
+                            else:
+                                # 時間が累積時間が最も長いラベルの時間より短い場合
+                                # ( heapq と Label の大小比較の実装により、 labels_next[0] は累積時間が最も長いラベルとなっている)
+                                if cumulative_time_next < labels_next[0].cumulative_time:
+                                    heapq.heapreplace(
+                                        labels_next,
+                                        self.__create_label(
+                                            cumulative_time_next, vertex_next_id,
+                                            label_this.sequence_number,
+                                        )
+                                    )
+                                    num_replacements += 1
+                                # そうでない場合
+                                else:
+                                    num_rejections += 1
+                # 省メモリモードでは、この頂点からの探索が終わったのでラベルを捨てる(パスは LabelArena からたどる)
+                self.__peak_num_live_labels[0] = max(
+                    self.__peak_num_live_labels[0], num_live_labels,
+                )
+                if self.bound_memory:
+                    self.__peak_bytes[0] = max(
+                        self.__peak_bytes[0],
+                        num_live_labels * bytes_per_label + self.__arena.nbytes_in_memory,
+                    )
+                if self.bound_memory and vertex_this_id != vertex_stop_id:
+                    num_live_labels -= len(labels_this)
+                    del self.__labels[vertex_this_id]
+                    self.__route_labels.pop(vertex_this_id, None)
+                # この頂点から延ばした候補の個数を累計ダイヤ数ごとに集計する
+                if self.collect_stats:
+                    num_relaxations: int = (
+                        num_pushes + num_replacements + num_rejections + num_pruned + num_unreachable
+                    )
+                    stats.relaxations_per_gem_row[cumulative_num_gems] += num_relaxations - stats.num_relaxations
+                    stats.relaxations_per_level[level_id] += num_relaxations - stats.num_relaxations
+                    stats.num_relaxations = num_relaxations
+            if self.collect_stats:
+                stats.seconds_per_level[level_id] = time.perf_counter() - time_level_start
+
+        if self.collect_stats:
+            stats.num_relaxations = (
+                num_pushes + num_replacements + num_rejections + num_pruned + num_unreachable
+            )
+            stats.num_pushes = num_pushes
+            stats.num_replacements = num_replacements
+            stats.num_rejections = num_rejections
+            stats.num_pruned = num_pruned
+            stats.num_unreachable = num_unreachable
+            stats.num_labels_skipped = num_labels_skipped
+            stats.seconds_total = time.perf_counter() - time_start
+
+    def iter_strategies(self) -> Iterator[tuple[list[Vertex], float]]:
+        """
+        チャートを第 1 最適から順に1個ずつ求める
+
+        第 1 最適の累積時間を一度求めた後、第 2 最適以降を再帰的な k 最短路の列挙(Recursive Enumeration Algorithm)で
+        必要になった分だけ求める( max_labels_per_vertex は使わない)
+        """
+        assert self.route_token is None, f'経路を区別する場合は逐次列挙できません'
+        gems_and_times: list[list[tuple[int, float]]] = self.instance.get_gems_and_times()
+        moves_in: list[list[tuple[int, float]]] = self.instance.get_moves_in()
+        num_required_gems: list[int] = self.instance.num_required_gems.tolist()
+        state_levels: list[int] = self.instance.get_state_levels().tolist()
+        state_gems: list[int] = self.instance.state_gems.tolist()
+        state_ids: list[list[int]] = self.instance.state_ids.tolist()
+        best_times: list[float] = self.__compute_best_times()
+
+        # 各頂点の第 r 最適のパス (累積時間, 直前の頂点の番号, 直前の頂点での順位, 移動時間, クリア時間)
+        # (最初の頂点たちでは直前の頂点の番号が -1 )
+        paths: dict[int, list[tuple[float, int, int, float, float]]] = {}
+        # 各頂点の次のパスの候補(値のデータ構造が list だが、 操作には heapq を使用する)
+        candidates: dict[int, list[tuple[float, int, int, float, float]]] = {}
+        exhausted: set[int] = set()
+
+        def initialize_candidates(vertex_id: int) -> list[tuple[float, int, int, float, float]]:
+            """頂点に入ってくる各枝について、直前の頂点の第 1 最適のパスを延ばしたものを候補とする"""
+            level_id: int = state_levels[vertex_id]
+            cumulative_num_gems: int = state_gems[vertex_id]
+            cs: list[tuple[float, int, int, float, float]] = []
+            if level_id == 0:
+                cs.append((best_times[vertex_id], -1, 0, 0.0, 0.0))
+            for level_prev_id, time_move in moves_in[level_id]:
+                for num_gems, time_clear in gems_and_times[level_id]:
+                    cumulative_num_gems_prev: int = cumulative_num_gems - num_gems
+                    if cumulative_num_gems_prev < num_required_gems[level_id]:
+                        break
+                    vertex_prev_id: int = state_ids[level_prev_id][cumulative_num_gems_prev]
+                    if vertex_prev_id < 0:
+                        continue
+                    cs.append((
+                        best_times[vertex_prev_id] + time_move + time_clear,
+                        vertex_prev_id, 0, time_move, time_clear,
+                    ))
+            heapq.heapify(cs)
+            return cs
+
+        def find_path(vertex_id: int, rank: int) -> bool:
+            """頂点の第 rank 最適のパスを(まだなければ)求め、存在するかを返す"""
+            # 再帰呼び出しの代わりにスタックを使う(パスの長さが再帰の上限を超えないように)
+            stack: list[tuple[int, int]] = [(vertex_id, rank)]
+            while len(stack) > 0:
+                v, r = stack[-1]
+                if v in exhausted or len(paths.get(v, [])) > r:
+                    stack.pop()
+                    continue
+                # まだ候補がない場合(第 1 最適のパス)
+                if v not in candidates.keys():
+                    candidates[v] = initialize_candidates(v)
+                    paths[v] = []
+                # 直前に求めたパスの直前の頂点での次の順位のパスを延ばしたものを候補に加える
+                else:
+                    _, u, j, time_move, time_clear = paths[v][-1]
+                    # (直前の頂点のパスが尽きていても、尽きる前に求めたパスは候補に加える)
+                    if u >= 0:
+                        if len(paths[u]) > j + 1:
+                            heapq.heappush(candidates[v], (
+                                paths[u][j + 1][0] + time_move + time_clear,
+                                u, j + 1, time_move, time_clear,
+                            ))
+                        elif u not in exhausted:
+                            stack.append((u, j + 1))
+                            continue
+                # 候補のうち累積時間が最も短いものを次のパスとする
+                stack.pop()
+                if len(candidates[v]) > 0:
+                    path: tuple[float, int, int, float, float] = heapq.heappop(candidates[v])
+                    paths[v].append(path)
+                    # 直前の頂点の第 1 最適のパスがまだ求まっていない場合は求める
+                    if path[1] >= 0 and path[1] not in paths.keys():
+                        stack.append((path[1], path[2]))
+                else:
+                    exhausted.add(v)
+            return len(paths.get(vertex_id, [])) > rank
+
+        vertex_stop_id: int = int(self.instance.state_ids[-1, -1])
+        if vertex_stop_id < 0:
+            return
+        rank: int = 0
+        while find_path(vertex_stop_id, rank) is True:
+            # (最終面, 最小必要ダイヤ数) のパスから直前の頂点と順位を逆にたどってパスを構築
+            vertices: list[Vertex] = []
+            v, r = vertex_stop_id, rank
+            while v >= 0:
+                vertices.append(self.__get_vertex(v))
+                _, v, r, _, _ = paths[v][r]
+            vertices.reverse()
+            yield vertices, paths[vertex_stop_id][rank][0]
+            rank += 1
+
+    def __compute_best_times(self) -> list[float]:
+        """各頂点の第 1 最適の累積時間を求める"""
+        max_required_gems: int = self.max_required_gems
+        gems_and_times: list[list[tuple[int, float]]] = self.instance.get_gems_and_times()
+        moves: list[list[tuple[int, float, int]]] = self.instance.get_moves()
+        state_offsets: list[int] = self.instance.state_offsets.tolist()
+        state_gems: list[int] = self.instance.state_gems.tolist()
+        state_ids: list[list[int]] = self.instance.state_ids.tolist()
+
+        best_times: list[float] = [math.inf] * self.instance.num_states
+        for cumulative_num_gems, cumulative_time in gems_and_times[0]:
+            if cumulative_num_gems <= max_required_gems and state_ids[0][cumulative_num_gems] >= 0:
+                best_times[state_ids[0][cumulative_num_gems]] = cumulative_time
+        # (面, ダイヤ数) を辞書式の順番で探索
+        for level_id in range(self.instance.num_levels):
+            for vertex_this_id in range(state_offsets[level_id], state_offsets[level_id + 1]):
+                cumulative_num_gems: int = state_gems[vertex_this_id]
+                time_this: float = best_times[vertex_this_id]
+                for level_next_id, time_move, num_required_gems in moves[level_id]:
+                    if cumulative_num_gems < num_required_gems:
+                        continue
+                    for num_gems_next, time_next in gems_and_times[level_next_id]:
+                        cumlative_num_gems_next: int = cumulative_num_gems + num_gems_next
+                        if cumlative_num_gems_next > max_required_gems:
+                            break
+                        vertex_next_id: int = state_ids[level_next_id][cumlative_num_gems_next]
+                        if vertex_next_id < 0:
+                            continue
+                        time_next_total: float = time_this + time_move + time_next
+                        if time_next_total < best_times[vertex_next_id]:
+                            best_times[vertex_next_id] = time_next_total
+        return best_times
+
+    def __compute_time_upper_bound(self,
+            level_id: int, costs_to_go: list[float],
+            ) -> float:
+        """
+        面 level_id のラベルに残り時間の下界を足したものの第 max_labels_per_vertex 最小値を求める
+        (同じ面のラベルのパスはどれも異なるチャートになるため、第 max_labels_per_vertex 最適のチャートの累積時間の上限となる)
+        """
+        times: list[float] = [
+            l.cumulative_time + costs_to_go[v]
+            for v in range(
+                int(self.instance.state_offsets[level_id]),
+                int(self.instance.state_offsets[level_id + 1]),
+            )
+            for l in self.__labels.get(v, [])
+        ]
+        # 経路を区別する場合は、ダイヤ数だけが異なる(同じ経路の)ラベルを 1 個と数える
+        if self.route_token is not None:
+            times_per_route: dict[int, float] = {}
+            for v in range(
+                    int(self.instance.state_offsets[level_id]),
+                    int(self.instance.state_offsets[level_id + 1])):
+                for r, l in self.__route_labels.get(v, {}).items():
+                    times_per_route[r] = min(
+                        times_per_route.get(r, math.inf), l.cumulative_time + costs_to_go[v],
+                    )
+            times = [t for t in times_per_route.values()]
+        if len(times) < self.max_labels_per_vertex:
+            return math.inf
+        # 下界の計算と足し算の順序が異なることによる丸め誤差の分だけ余裕を持たせる(時間が整数の場合は不要)
+        return (
+            heapq.nsmallest(self.max_labels_per_vertex, times)[-1] +
+            (self._time_tolerance if self.instance.time_scale is None else 0)
+        )
+
+    def __inherit_labels(self,
+            opt_old: OptimizerByDynamicProgramming, level_id_changed: int,
+            ) -> None:
+        """
+        opt_old のラベルのうち、面の番号が level_id_changed より手前の頂点のものを引き継ぐ
+
+        引き継ぐラベルには作られた順に通し番号を付け直す(各頂点のラベルの順序と heapq の配列の並びは変わらない)
+        """
+        vertex_id_changed: int = int(self.instance.state_offsets[level_id_changed])
+        labels_old: list[Label] = sorted(
+            (
+                l for v, ls in opt_old.__labels.items() if v < vertex_id_changed
+                for l in ls
+            ),
+            key=lambda x: x.sequence_number,
+        )
+        # 直前のラベルは常に先に作られており、同じく引き継がれる
+        label_ids_new: dict[int, int] = {-1: -1}
+        for label_old in labels_old:
+            label_ids_new[label_old.sequence_number] = self.__create_label(
+                label_old.cumulative_time, label_old.vertex_id,
+                label_ids_new[label_old.label_prev_id],
+                opt_old.__label_routes[label_old.sequence_number] if self.route_token is not None else -1,
+            ).sequence_number
+        for v, ls in opt_old.__labels.items():
+            if v < vertex_id_changed:
+                self.__labels[v] = [
+                    self.__labels_all[label_ids_new[l.sequence_number]] for l in ls
+                ]
+        # 経路を区別する場合は、経路の番号もそのまま引き継ぐ
+        if self.route_token is not None:
+            self.__routes.update(opt_old.__routes)
+            for v, ls in self.__labels.items():
+                self.__route_labels[v] = {self.__label_routes[l.sequence_number]: l for l in ls}
+
+    def __get_bytes_per_label(self) -> int:
+        """Label オブジェクト1個と、それを指すリストの要素(省メモリモードでない場合は全ラベルの配列の要素も)のバイト数"""
+        return sys.getsizeof(Label(0.0, 0, -1, 0)) + 8 * (1 if self.bound_memory else 2)
+
+    def __get_vertex(self, vertex_id: int) -> Vertex:
+        """頂点の番号から頂点を取得する"""
+        level_id: int = int(np.searchsorted(
+            self.instance.state_offsets, vertex_id, side='right',
+        )) - 1
+        return Vertex(self.levels[level_id], int(self.instance.state_gems[vertex_id]))
+
+    def __relax_route_label(self,
+            vertex_next_id: int, route_next_key: tuple[int, Hashable],
+            cumulative_time_next: float, label_prev_id: int,
+            ) -> int:
+        """
+        経路を区別する場合に、経路のキーが route_next_key の候補を頂点 vertex_next_id のラベルたちと比較し、
+        ラベルとして加えた場合は 0 、いずれかのラベルを置き換えた場合は 1 、捨てた場合は 2 を返す
+        (経路の番号は、候補がラベルになる場合にだけ新しく付ける)
+        """
+        labels_next: list[Label] = self.__labels.setdefault(vertex_next_id, [])
+        route_labels: dict[int, Label] = self.__route_labels.setdefault(vertex_next_id, {})
+        route_next_id: int | None = self.__routes.get(route_next_key)
+        label_same_route: Label | None = (
+            None if route_next_id is None else route_labels.get(route_next_id)
+        )
+        # 同じ経路のラベルがある場合は、累積時間が短いときだけそのラベルを置き換える
+        if label_same_route is not None:
+            assert route_next_id is not None
+            if cumulative_time_next >= label_same_route.cumulative_time:
+                return 2
+            label_new: Label = self.__create_label(
+                cumulative_time_next, vertex_next_id, label_prev_id, route_next_id,
+            )
+            labels_next[labels_next.index(label_same_route)] = label_new
+            heapq.heapify(labels_next)
+            route_labels[route_next_id] = label_new
+            return 1
+        # 最大個数に達していて、時間が累積時間が最も長いラベルの時間以上の場合
+        is_full: bool = len(labels_next) >= self.max_labels_per_vertex
+        if is_full and cumulative_time_next >= labels_next[0].cumulative_time:
+            return 2
+        if route_next_id is None:
+            route_next_id = self.__routes.setdefault(route_next_key, len(self.__routes))
+        label_new = self.__create_label(
+            cumulative_time_next, vertex_next_id, label_prev_id, route_next_id,
+        )
+        route_labels[route_next_id] = label_new
+        if is_full:
+            label_old: Label = heapq.heapreplace(labels_next, label_new)
+            del route_labels[self.__label_routes[label_old.sequence_number]]
+            return 1
+        heapq.heappush(labels_next, label_new)
+        return 0
+
+    def __create_label(self,
+            cumulative_time: float, vertex_id: int, label_prev_id: int,
+            route_id: int = -1,
+            ) -> Label:
+        """
+        ラベルを作り、全ラベルの配列(省メモリモードでは LabelArena )に加える
+        (経路を区別する場合は、経路の番号 route_id も記録する)
+        """
+        if self.route_token is not None:
+            self.__label_routes.append(route_id)
+        if self.bound_memory:
+            return Label(
+                cumulative_time, vertex_id, label_prev_id,
+                self.__arena.append(vertex_id, label_prev_id),
+            )
+        label: Label = Label(
+            cumulative_time, vertex_id, label_prev_id, len(self.__labels_all),
+        )
+        self.__labels_all.append(label)
+        return label
+
+    def __repr_labels(self, labels: list[Label]) -> str:
+        return "', '".join([str(l) for l in labels])
+
+    def __repr__(self) -> str:
+        s: str = ''
+        s += f'levels=\n'
+        s += f'\n'.join([str(l) for l in self.levels]) + '\n'
+        s += f'mlpv={self.max_labels_per_vertex}\n'
+        s += f'lables='
+        if len(self.__labels) > 0:
+            s += '\n' + f'\n'.join([
+                f"{self.__get_vertex(v)}: ['{self.__repr_labels(ls)}']"
+                for v, ls in self.__labels.items()
+            ]) + '\n'
+        else:
+            s += '(Empty)'
+        return s
+# ----------------------------------------------------------------------
+# -----------------------------------------------------------------------------
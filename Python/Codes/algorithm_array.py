@@ -0,0 +1,211 @@
+# Project
+# -----------------------------------------------------------------------------
+# Title   : Dynamic Programming for Optimal Speedrun Strategy Exploration
+# Author  : [Twitter] @samuelladoco  [Twitch] SLDCtwitch
+# Contents: Dynamic programming algorithm on NumPy arrays
+# -----------------------------------------------------------------------------
+
+
+# Import
+# -----------------------------------------------------------------------------
+from __future__ import annotations
+import concurrent.futures
+import dataclasses
+import numpy as np
+#
+from algorithm import Vertex
+from instance import CompiledInstance
+from level import Level
+# -----------------------------------------------------------------------------
+
+
+# Classes
+# -----------------------------------------------------------------------------
+# ----------------------------------------------------------------------
+@dataclasses.dataclass(frozen=True, )
+class OptimizerByDynamicProgrammingWithArrays:
+    """
+    動的計画法によるチャートの最適化( NumPy 配列版)
+
+    ラベルを (面の番号, 累計ダイヤ数, 順位) で添字付けされた密な配列(累積時間と直前のラベルの添字)で保持し、
+    面ごとに全ての累計ダイヤ数の行の候補をまとめて上位 k 個に絞り込む。
+    OptimizerByDynamicProgramming と同じ形式のチャートを返す。
+    インスタンスの time_scale が None でない場合、累積時間は int64 の配列で保持する。
+
+    Parameters
+    ----------
+    instance : CompiledInstance
+        配列に変換したインスタンス
+    max_labels_per_vertex : int
+        求めたいチャートの個数（ 第 1 最適 ～ 最大で 第 max_labels_per_vertex 最適 まで）
+    num_workers : int
+        2 以上の場合、互いに独立な面と累計ダイヤ数の行の範囲の絞り込みを num_workers 個のスレッドで並列に行う
+        ( NumPy の処理は GIL を解放するため、ラベルの配列を共有したまま複数のコアを使える)
+    """
+    instance: CompiledInstance
+    max_labels_per_vertex: int
+    num_workers: int = dataclasses.field(default=1, compare=False)
+
+    @property
+    def levels(self) -> list[Level]:
+        """(手前の面から並んだ)面のリスト"""
+        return self.instance.levels
+
+    @property
+    def max_required_gems(self) -> int:
+        """開放に必要なダイヤ数が最も多い面の必要ダイヤ数"""
+        return self.instance.max_required_gems
+
+    def solve(self) -> list[tuple[list[Vertex], float]]:
+        """チャートを求める"""
+        num_levels: int = self.instance.num_levels
+        num_rows: int = self.max_required_gems + 1
+        k: int = self.max_labels_per_vertex
+        gems_and_times: list[list[tuple[int, float]]] = self.instance.get_gems_and_times()
+        moves_in: list[list[tuple[int, float]]] = self.instance.get_moves_in()
+        num_required_gems: list[int] = self.instance.num_required_gems.tolist()
+        # 直前のラベルの添字は (面の番号, 累計ダイヤ数, 順位) を1次元にしたもの(ない場合は -1 )
+        index_dtype: type = (
+            np.int32 if num_levels * num_rows * k < 2 ** 31 else np.int64
+        )
+        # ラベルがないことを表す累積時間(整数の場合は、移動時間とクリア時間を足しても溢れない大きな値)
+        time_dtype: type
+        time_empty: float | int
+        if self.instance.time_scale is None:
+            time_dtype, time_empty = np.float64, np.inf
+        else:
+            time_dtype, time_empty = np.int64, np.iinfo(np.int64).max // 2
+        times: np.ndarray = np.full((num_levels, num_rows, k), time_empty, dtype=time_dtype)
+        prevs: np.ndarray = np.full((num_levels, num_rows, k), -1, dtype=index_dtype)
+        # 順位ごとの添字のずれ(ラベルの添字は (面の番号 * 行数 + 累計ダイヤ数) * k + 順位 で計算する)
+        ranks: np.ndarray = np.arange(k, dtype=index_dtype)
+
+        # 最初の頂点たちにラベルを付与する
+        for cumulative_num_gems, cumulative_time in gems_and_times[0]:
+            if cumulative_num_gems < num_rows:
+                times[0, cumulative_num_gems, 0] = cumulative_time
+
+        def merge_rows(j: int, row_begin: int, row_end: int) -> None:
+            """面 j の累計ダイヤ数が row_begin 以上 row_end 未満の行の候補をまとめて上位 k 個に絞り込む"""
+            blocks_time: list[np.ndarray] = []
+            blocks_prev: list[np.ndarray] = []
+            for i, time_move in moves_in[j]:
+                for num_gems_next, time_next in gems_and_times[j]:
+                    # 移動元の累計ダイヤ数は必要ダイヤ数以上で、移動先の累計ダイヤ数は最大必要ダイヤ数以下
+                    row_to_min: int = max(num_required_gems[j], 0) + num_gems_next
+                    row_to_begin: int = max(row_to_min, row_begin)
+                    if row_to_begin >= row_end:
+                        continue
+                    block_time: np.ndarray = np.full((row_end - row_begin, k), time_empty, dtype=time_dtype)
+                    block_prev: np.ndarray = np.full((row_end - row_begin, k), -1, dtype=index_dtype)
+                    # 時間 = この頂点までの累積時間 + 次に移動した面への移動時間 + 次に移動した面のクリア時間
+                    # (ラベルがない場合はラベルがないことを表す累積時間のままにする)
+                    block_time[row_to_begin - row_begin:] = np.minimum(
+                        times[i, row_to_begin - num_gems_next:row_end - num_gems_next] +
+                        time_move + time_next,
+                        time_empty,
+                    )
+                    rows_from: np.ndarray = np.arange(
+                        i * num_rows + row_to_begin - num_gems_next,
+                        i * num_rows + row_end - num_gems_next,
+                        dtype=index_dtype,
+                    )
+                    block_prev[row_to_begin - row_begin:] = rows_from[:, np.newaxis] * k + ranks
+                    blocks_time.append(block_time)
+                    blocks_prev.append(block_prev)
+            # 入ってくる枝がない場合
+            if len(blocks_time) == 0:
+                return
+            candidates_time: np.ndarray = np.concatenate(blocks_time, axis=1)
+            candidates_prev: np.ndarray = np.concatenate(blocks_prev, axis=1)
+            times[j, row_begin:row_end], prevs[j, row_begin:row_end] = self.__select_k_best(
+                candidates_time, candidates_prev, k, time_empty,
+            )
+
+        # 面を手前から順に、全ての累計ダイヤ数の行をまとめて確定させる
+        if self.num_workers <= 1:
+            for j in range(1, num_levels):
+                merge_rows(j, 0, num_rows)
+        # 入ってくる移動の移動元が全て確定した面たちを1つの波とし、
+        # 波の中の各面の累計ダイヤ数の行の範囲ごとの絞り込みを並列に行う
+        # (各絞り込みは確定した面だけを読み、異なる範囲に書き込むので、結果は逐次の場合と一致する)
+        else:
+            with concurrent.futures.ThreadPoolExecutor(self.num_workers) as executor:
+                for wave in self.__get_waves(moves_in)[1:]:
+                    num_chunks: int = min(
+                        -(-self.num_workers // len(wave)), num_rows,
+                    )
+                    row_bounds: list[int] = np.linspace(
+                        0, num_rows, num_chunks + 1, dtype=np.int64,
+                    ).tolist()
+                    futures: list[concurrent.futures.Future] = [
+                        executor.submit(merge_rows, j, row_bounds[c], row_bounds[c + 1])
+                        for j in wave for c in range(num_chunks)
+                    ]
+                    for future in futures:
+                        future.result()
+
+        # (最終面, 最小必要ダイヤ数) の各ラベルから直前のラベルの添字を逆にたどってパスを構築
+        strategies: list[tuple[list[Vertex], float]] = []
+        for rank in range(k):
+            if times[-1, -1, rank] == time_empty:
+                break
+            cumulative_time: float = times[-1, -1, rank].item()
+            vertices: list[Vertex] = []
+            index: int = (num_levels * num_rows - 1) * k + rank
+            while index >= 0:
+                i, row, _ = np.unravel_index(index, times.shape)
+                vertices.append(Vertex(self.levels[int(i)], int(row)))
+                index = int(prevs.flat[index])
+            #
+            vertices.reverse()
+            strategies.append((vertices, cumulative_time))
+
+        return strategies
+
+    @staticmethod
+    def __get_waves(moves_in: list[list[tuple[int, float]]]) -> list[list[int]]:
+        """面の番号を、入ってくる移動の移動元の面が全て手前の波に含まれるように波に分ける"""
+        depths: list[int] = []
+        for ms in moves_in:
+            depths.append(max((depths[i] + 1 for i, _ in ms), default=0))
+        waves: list[list[int]] = [[] for _ in range(max(depths, default=-1) + 1)]
+        for j, d in enumerate(depths):
+            waves[d].append(j)
+        return waves
+
+    @staticmethod
+    def __select_k_best(
+            candidates_time: np.ndarray,
+            candidates_prev: np.ndarray,
+            k: int,
+            time_empty: float | int,
+            ) -> tuple[np.ndarray, np.ndarray]:
+        """各行の候補から累積時間の短い順に k 個を選ぶ(同じ時間の場合は候補の並び順)"""
+        num_candidates: int = candidates_time.shape[1]
+        # 候補数が k 未満の場合は足りない分を空のラベルで埋める
+        if num_candidates < k:
+            candidates_time = np.pad(
+                candidates_time, ((0, 0), (0, k - num_candidates)),
+                constant_values=time_empty,
+            )
+            candidates_prev = np.pad(
+                candidates_prev, ((0, 0), (0, k - num_candidates)),
+                constant_values=-1,
+            )
+        # (累積時間, 候補の並び順) の辞書式の順番で上位 k 個を選ぶ
+        # ( k 番目と同じ時間の候補が複数ある場合も、選ぶ候補が一意に決まるように安定ソートを使う)
+        selected: np.ndarray = np.argsort(candidates_time, axis=1, kind='stable')[:, :k]
+        return (
+            np.take_along_axis(candidates_time, selected, axis=1),
+            np.take_along_axis(candidates_prev, selected, axis=1),
+        )
+
+    def __repr__(self) -> str:
+        s: str = ''
+        s += f'levels=\n'
+        s += f'\n'.join([str(l) for l in self.levels]) + '\n'
+        s += f'mlpv={self.max_labels_per_vertex}'
+        return s
+# ----------------------------------------------------------------------
+# -----------------------------------------------------------------------------
@@ -0,0 +1,281 @@
+# Project
+# -----------------------------------------------------------------------------
+# Title   : Dynamic Programming for Optimal Speedrun Strategy Exploration
+# Author  : [Twitter] @samuelladoco  [Twitch] SLDCtwitch
+# Contents: Batch solver for many instances and parameters with a process pool
+# -----------------------------------------------------------------------------
+
+
+# Import
+# -----------------------------------------------------------------------------
+from __future__ import annotations
+import concurrent.futures
+import dataclasses
+import itertools
+import pathlib
+import time
+from typing import ClassVar, Iterator
+#
+from algorithm import OptimizerByDynamicProgramming, Vertex
+from algorithm_array import OptimizerByDynamicProgrammingWithArrays
+from instance import CompiledInstance
+from rw import Csv, Reader, Writer, workspace_base_folder
+# -----------------------------------------------------------------------------
+
+
+# Classes
+# -----------------------------------------------------------------------------
+# ----------------------------------------------------------------------
+@dataclasses.dataclass(frozen=True, )
+class Job:
+    """
+    バッチ処理の1つのジョブ(1つのインスタンスを1組のパラメータで解く)
+
+    Parameters
+    ----------
+    instance_name : str
+        インスタンス名( Input フォルダの下のフォルダ名)
+    num_strategies : int
+        求めたいチャートの個数
+    levels_file_name : str
+        Levels ファイルのファイル名(仮定の値に変更したファイルを使う場合など)
+    moves_file_name : str
+        Moves ファイルのファイル名
+    engine : str
+        'heap' (ヒープでラベルを保持) か 'array' ( NumPy の配列でラベルを保持)
+    prune_by_lower_bounds : bool
+        残り時間の下界による枝刈りをするか( 'heap' のみ)
+    bound_memory : bool
+        省メモリモードで解くか( 'heap' のみ)
+    time_scale : int | None
+        None でない場合、時間を 1 / time_scale 秒単位の整数として解く
+    num_workers : int
+        並列に絞り込むスレッド数( 'array' のみ)
+    output_name : str | None
+        出力ファイル Solutions_<output_name>.csv の名前(None の場合はインスタンス名などから決める)
+    """
+    instance_name: str
+    num_strategies: int
+    levels_file_name: str = 'Levels.csv'
+    moves_file_name: str = 'Moves.csv'
+    engine: str = 'heap'
+    prune_by_lower_bounds: bool = False
+    bound_memory: bool = False
+    time_scale: int | None = None
+    num_workers: int = 1
+    output_name: str | None = None
+
+    def get_input_key(self) -> tuple[str, str, str]:
+        """読み込むファイルを表すキー(このキーが同じジョブは読み込んだインスタンスを共有する)"""
+        return (self.instance_name, self.levels_file_name, self.moves_file_name)
+
+    def get_output_name(self) -> str:
+        """出力ファイルの名前を取得する"""
+        if self.output_name is not None:
+            return self.output_name
+        name: str = self.instance_name
+        for file_name, default in (
+                (self.levels_file_name, 'Levels.csv'),
+                (self.moves_file_name, 'Moves.csv')):
+            if file_name != default:
+                name += f'_{pathlib.Path(file_name).stem}'
+        name += f'_k{self.num_strategies}_{self.engine}'
+        if self.time_scale is not None:
+            name += f'_s{self.time_scale}'
+        return name
+# ----------------------------------------------------------------------
+
+# ----------------------------------------------------------------------
+@dataclasses.dataclass(frozen=True, )
+class JobResult:
+    """
+    ジョブの処理結果
+
+    Parameters
+    ----------
+    job : Job
+        ジョブ
+    load_seconds : float
+        共有済みのインスタンスの取得( time_scale への変換を含む)にかかった時間
+    input_load_seconds : float
+        ジョブの入力のファイルの読み込みにかかった時間(同じ入力のジョブの間で共有し、入力ごとに1回だけかかる)
+    solve_seconds : float
+        チャートを求めるのにかかった時間
+    write_seconds : float
+        チャートの出力にかかった時間
+    num_strategies_found : int
+        求まったチャートの個数
+    best_time : float | None
+        第 1 最適のチャートの時間(チャートがない場合は None )
+    estimated_peak_bytes : int | None
+        ラベルのメモリ使用量の最大値の見積もり( 'heap' のみ)
+    """
+    job: Job
+    load_seconds: float
+    input_load_seconds: float
+    solve_seconds: float
+    write_seconds: float
+    num_strategies_found: int
+    best_time: float | None
+    estimated_peak_bytes: int | None = None
+
+    @property
+    def wall_seconds(self) -> float:
+        """ジョブ全体にかかった時間(入力のファイルの読み込みは含まない)"""
+        return self.load_seconds + self.solve_seconds + self.write_seconds
+# ----------------------------------------------------------------------
+
+# ----------------------------------------------------------------------
+class BatchSolver:
+    """ジョブのリストをプロセスプールで並列に解く(クラスメソッドのみ)"""
+
+    # 読み込んだインスタンス(プロセスごとに保持し、同じファイルを読むジョブの間で共有する)
+    __instances: ClassVar[dict[tuple[str, str, str], CompiledInstance]] = {}
+    # 読み込んだインスタンスの読み込みにかかった時間
+    __input_load_seconds: ClassVar[dict[tuple[str, str, str], float]] = {}
+
+    @classmethod
+    def run(cls,
+            jobs: list[Job],
+            max_workers: int | None = None,
+            ) -> Iterator[JobResult]:
+        """
+        jobs をプロセスプールで並列に解き、終わったジョブから順に Solutions ファイルを出力して結果を返す
+
+        起動前に各入力を1回ずつ読み込んでおくので、 fork でプロセスを作る環境ではワーカーもそれを共有する
+        ( spawn の環境では各ワーカーが最初に使うときに1回だけ読み込む)
+        """
+        for job in jobs:
+            cls.__get_instance(job)
+        #
+        if max_workers == 1:
+            for job in jobs:
+                yield cls.solve_job(job)
+            return
+        with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+            futures: list[concurrent.futures.Future[JobResult]] = [
+                executor.submit(cls.solve_job, job) for job in jobs
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                yield future.result()
+
+    @classmethod
+    def solve_job(cls, job: Job) -> JobResult:
+        """1つのジョブを解き、 Solutions ファイルを出力する(ワーカーのプロセスで実行される)"""
+        time_start: float = time.perf_counter()
+        instance: CompiledInstance = cls.__get_instance(job).with_time_scale(
+            job.time_scale
+        )
+        time_loaded: float = time.perf_counter()
+        #
+        opt_by_dp: OptimizerByDynamicProgramming | OptimizerByDynamicProgrammingWithArrays
+        if job.engine == 'array':
+            opt_by_dp = OptimizerByDynamicProgrammingWithArrays(
+                instance, job.num_strategies, job.num_workers,
+            )
+        else:
+            opt_by_dp = OptimizerByDynamicProgramming(
+                instance, job.num_strategies, job.prune_by_lower_bounds, job.bound_memory,
+            )
+        strategies: list[tuple[list[Vertex], float]] = opt_by_dp.solve()
+        time_solved: float = time.perf_counter()
+        #
+        if len(strategies) > 0:
+            Writer.output_strategies(
+                job.get_output_name(), strategies, job.time_scale,
+            )
+        time_written: float = time.perf_counter()
+        #
+        return JobResult(
+            job,
+            time_loaded - time_start,
+            cls.__input_load_seconds[job.get_input_key()],
+            time_solved - time_loaded,
+            time_written - time_solved,
+            len(strategies),
+            (
+                None if len(strategies) == 0 else
+                strategies[0][1] if job.time_scale is None else
+                strategies[0][1] / job.time_scale
+            ),
+            (
+                opt_by_dp.get_memory_usage()['estimated_peak_bytes']
+                if isinstance(opt_by_dp, OptimizerByDynamicProgramming) else None
+            ),
+        )
+
+    @classmethod
+    def output_report(cls,
+            report_name: str,
+            results: list[JobResult],
+            ) -> None:
+        """各ジョブの処理時間などを BatchReport_<report_name>.csv に出力する"""
+        Csv.write(
+            workspace_base_folder / 'Output' / f'BatchReport_{report_name}.csv',
+            [
+                'OutputName', 'Instance', 'LevelsFile', 'MovesFile', 'Engine',
+                'NumStrategies', 'NumStrategiesFound', 'BestTime',
+                'InputLoadSeconds', 'LoadSeconds', 'SolveSeconds', 'WriteSeconds', 'WallSeconds',
+                'EstimatedPeakBytes',
+            ],
+            (
+                [
+                    r.job.get_output_name(), r.job.instance_name,
+                    r.job.levels_file_name, r.job.moves_file_name, r.job.engine,
+                    r.job.num_strategies, r.num_strategies_found,
+                    '' if r.best_time is None else f'{r.best_time:.2f}',
+                    f'{r.input_load_seconds:.3f}', f'{r.load_seconds:.3f}', f'{r.solve_seconds:.3f}',
+                    f'{r.write_seconds:.3f}', f'{r.wall_seconds:.3f}',
+                    '' if r.estimated_peak_bytes is None else r.estimated_peak_bytes,
+                ]
+                for r in results
+            ),
+        )
+
+    @classmethod
+    def __get_instance(cls, job: Job) -> CompiledInstance:
+        """ジョブの入力のインスタンスを(このプロセスで未読込の場合は読み込んで)取得する"""
+        key: tuple[str, str, str] = job.get_input_key()
+        if key not in cls.__instances.keys():
+            time_start: float = time.perf_counter()
+            # (使われ得ない移動は、チャートが変わらないので取り除いておく)
+            cls.__instances[key] = CompiledInstance.from_levels([
+                l for l in Reader.read_levels_and_moves_compiled(
+                    job.instance_name, job.levels_file_name, job.moves_file_name,
+                ).values()
+            ]).without_unusable_moves()
+            cls.__input_load_seconds[key] = time.perf_counter() - time_start
+        return cls.__instances[key]
+# ----------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+
+
+# Settings
+# -----------------------------------------------------------------------------
+# Name of report file (BatchReport_<report_name>.csv)
+report_name: str = 'Sweep'
+# Number of processes (None: number of CPUs)
+max_workers: int | None = None
+# Jobs: all combinations of instances and numbers of strategies
+jobs: list[Job] = [
+    Job(instance_name, num_strategies)
+    for instance_name, num_strategies in itertools.product(
+        ['CTTT'], [1, 11, 50, 100],
+    )
+]
+# -----------------------------------------------------------------------------
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    results: list[JobResult] = []
+    for result in BatchSolver.run(jobs, max_workers):
+        print(
+            f'{result.job.get_output_name()}: ' +
+            f'{result.wall_seconds:.3f} s ' +
+            f'(input load {result.input_load_seconds:.3f} s, load {result.load_seconds:.3f} s, solve {result.solve_seconds:.3f} s, ' +
+            f'write {result.write_seconds:.3f} s)'
+        )
+        results.append(result)
+    BatchSolver.output_report(report_name, results)
+# -----------------------------------------------------------------------------
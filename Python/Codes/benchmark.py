@@ -0,0 +1,147 @@
+# Project
+# -----------------------------------------------------------------------------
+# Title   : Dynamic Programming for Optimal Speedrun Strategy Exploration
+# Author  : [Twitter] @samuelladoco  [Twitch] SLDCtwitch
+# Contents: Benchmark on synthetic instances
+# -----------------------------------------------------------------------------
+
+
+# Import
+# -----------------------------------------------------------------------------
+from __future__ import annotations
+import dataclasses
+import datetime
+import itertools
+import json
+import platform
+import statistics
+import time
+from typing import Any
+import numpy as np
+#
+from algorithm import OptimizerByDynamicProgramming, Vertex
+from algorithm_array import OptimizerByDynamicProgrammingWithArrays
+from generator import SyntheticInstance
+from instance import CompiledInstance
+from rw import Reader, Writer, workspace_base_folder
+# -----------------------------------------------------------------------------
+
+
+# Classes
+# -----------------------------------------------------------------------------
+# ----------------------------------------------------------------------
+class Benchmark:
+    """人工的なインスタンスでの読み込み、求解、出力の時間の計測(クラスメソッドのみ)"""
+
+    @classmethod
+    def run(cls,
+            synthetic_instances: list[SyntheticInstance],
+            nums_strategies: list[int],
+            engines: list[str],
+            num_repeats: int,
+            ) -> list[dict[str, Any]]:
+        """
+        インスタンス、求めたいチャートの個数、アルゴリズムの組み合わせごとに時間を num_repeats 回計測する
+
+        インスタンスは Input/Synthetic_e<エピソード数>_p<ページ数>_b<寄り道数>_s<シード>/ に生成する。
+        各回の時間と、その中央値を返す
+        """
+        results: list[dict[str, Any]] = []
+        for synthetic_instance in synthetic_instances:
+            instance_name: str = (
+                f'Synthetic_e{synthetic_instance.num_episodes}_' +
+                f'p{synthetic_instance.num_pages}_' +
+                f'b{synthetic_instance.branching}_' +
+                f's{synthetic_instance.seed}'
+            )
+            synthetic_instance.write(instance_name)
+            for num_strategies, engine in itertools.product(nums_strategies, engines):
+                seconds: dict[str, list[float]] = {'load': [], 'solve': [], 'write': []}
+                result: dict[str, Any] = {
+                    'instance_name': instance_name,
+                    'synthetic_instance': dataclasses.asdict(synthetic_instance),
+                    'num_strategies': num_strategies,
+                    'engine': engine,
+                }
+                for _ in range(num_repeats):
+                    time_start: float = time.perf_counter()
+                    instance: CompiledInstance = CompiledInstance.from_levels([
+                        l for l in Reader.read_levels_and_moves(instance_name).values()
+                    ])
+                    time_loaded: float = time.perf_counter()
+                    opt_by_dp: OptimizerByDynamicProgramming | OptimizerByDynamicProgrammingWithArrays = (
+                        OptimizerByDynamicProgrammingWithArrays(instance, num_strategies)
+                        if engine == 'array' else
+                        OptimizerByDynamicProgramming(instance, num_strategies)
+                    )
+                    strategies: list[tuple[list[Vertex], float]] = opt_by_dp.solve()
+                    time_solved: float = time.perf_counter()
+                    Writer.output_strategies(instance_name, strategies)
+                    time_written: float = time.perf_counter()
+                    #
+                    seconds['load'].append(time_loaded - time_start)
+                    seconds['solve'].append(time_solved - time_loaded)
+                    seconds['write'].append(time_written - time_solved)
+                    result['num_levels'] = instance.num_levels
+                    result['num_states'] = instance.num_states
+                    result['num_strategies_found'] = len(strategies)
+                for key, ss in seconds.items():
+                    result[f'seconds_{key}'] = ss
+                    result[f'seconds_{key}_median'] = statistics.median(ss)
+                results.append(result)
+                print(
+                    f'{instance_name} k={num_strategies} {engine}: ' +
+                    ', '.join(f'{key} {statistics.median(ss):.3f} s' for key, ss in seconds.items())
+                )
+        return results
+
+    @classmethod
+    def output_results(cls,
+            benchmark_name: str,
+            results: list[dict[str, Any]],
+            ) -> None:
+        """計測結果を実行環境の情報とともに Benchmark_<benchmark_name>.json に出力する"""
+        with open(
+                workspace_base_folder / 'Output' / f'Benchmark_{benchmark_name}.json',
+                'w', encoding='utf-8') as f:
+            json.dump(
+                {
+                    'datetime': datetime.datetime.now().isoformat(timespec='seconds'),
+                    'python': platform.python_version(),
+                    'numpy': np.__version__,
+                    'platform': platform.platform(),
+                    'processor': platform.processor(),
+                    'results': results,
+                },
+                f, indent=4,
+            )
+# ----------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+
+
+# Settings
+# -----------------------------------------------------------------------------
+# Name of result file (Benchmark_<benchmark_name>.json) (None: date and time)
+benchmark_name: str | None = None
+# Sizes of synthetic instances
+synthetic_instances: list[SyntheticInstance] = [
+    SyntheticInstance(num_episodes, num_pages)
+    for num_episodes, num_pages in [(1, 20), (3, 20), (5, 30)]
+]
+# Numbers of strategies
+nums_strategies: list[int] = [1, 10, 50]
+# Engines of algorithm
+engines: list[str] = ['heap', 'array']
+# Number of repeats of each measurement
+num_repeats: int = 3
+# -----------------------------------------------------------------------------
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    Benchmark.output_results(
+        benchmark_name if benchmark_name is not None else
+        datetime.datetime.now().strftime('%Y%m%d_%H%M%S'),
+        Benchmark.run(synthetic_instances, nums_strategies, engines, num_repeats),
+    )
+# -----------------------------------------------------------------------------
@@ -0,0 +1,161 @@
+# Project
+# -----------------------------------------------------------------------------
+# Title   : Dynamic Programming for Optimal Speedrun Strategy Exploration
+# Author  : [Twitter] @samuelladoco  [Twitch] SLDCtwitch
+# Contents: Cache of solutions on local disk
+# -----------------------------------------------------------------------------
+
+
+# Import
+# -----------------------------------------------------------------------------
+from __future__ import annotations
+import dataclasses
+import hashlib
+import json
+import os
+import pathlib
+from typing import Any
+#
+from algorithm import OptimizerByDynamicProgramming, Vertex
+from algorithm_array import OptimizerByDynamicProgrammingWithArrays
+from level import Level
+from rw import workspace_base_folder
+# -----------------------------------------------------------------------------
+
+
+# Classes
+# -----------------------------------------------------------------------------
+# ----------------------------------------------------------------------
+@dataclasses.dataclass(frozen=True, )
+class SolutionCache:
+    """
+    求めたチャートをローカルディスクに保存して再利用するキャッシュ
+
+    キーは Levels, Moves ファイルの内容のハッシュ値と、アルゴリズムの種類と設定( max_labels_per_vertex を除く)で、
+    キーごとにそれまでで最も多い個数を求めたチャートを1つの JSON ファイルとして保存する。
+    求めたいチャートの個数が保存済みの個数以下の場合は、保存済みのチャートの先頭を返す
+    (時間は求め直した場合と一致するが、 'heap' では同じ時間のチャートの順番や選ばれ方が異なる場合がある)。
+    ファイルの合計サイズが max_bytes を超えた場合は、最後に使われた時刻が古いファイルから削除する
+
+    Parameters
+    ----------
+    folder : pathlib.Path
+        キャッシュのファイルを置くフォルダ
+    max_bytes : int
+        キャッシュのファイルの合計サイズの上限
+    """
+    folder: pathlib.Path = workspace_base_folder / 'Output' / 'Cache'
+    max_bytes: int = 64 * 1024 * 1024
+
+    def get(self,
+            digest: str,
+            opt_by_dp: OptimizerByDynamicProgramming | OptimizerByDynamicProgrammingWithArrays,
+            ) -> list[tuple[list[Vertex], float]] | None:
+        """opt_by_dp で求めるチャートが保存済みならば(動的計画法を実行せずに)返し、そうでなければ None を返す"""
+        path: pathlib.Path = self.__get_path(digest, opt_by_dp)
+        if path.exists() is False:
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            entry: dict[str, Any] = json.load(f)
+        k: int = opt_by_dp.max_labels_per_vertex
+        # 保存済みの個数より多く求める場合(保存済みのチャートが全てのチャートの場合を除く)
+        if entry['num_strategies'] < k and len(entry['strategies']) == entry['num_strategies']:
+            return None
+        # 最後に使われた時刻を更新する
+        os.utime(path)
+        levels: dict[tuple[int, int], Level] = {l.ep_pg: l for l in opt_by_dp.levels}
+        return [
+            (
+                [Vertex(levels[ep, pg], num_gems) for ep, pg, num_gems in vertices],
+                time,
+            )
+            for time, vertices in entry['strategies'][:k]
+        ]
+
+    def put(self,
+            digest: str,
+            opt_by_dp: OptimizerByDynamicProgramming | OptimizerByDynamicProgrammingWithArrays,
+            strategies: list[tuple[list[Vertex], float]],
+            ) -> None:
+        """opt_by_dp で求めた strategies を保存する(保存済みのチャートの方が多い場合は何もしない)"""
+        path: pathlib.Path = self.__get_path(digest, opt_by_dp)
+        k: int = opt_by_dp.max_labels_per_vertex
+        if path.exists() is True:
+            with open(path, 'r', encoding='utf-8') as f:
+                if json.load(f)['num_strategies'] >= k:
+                    return
+        #
+        self.folder.mkdir(parents=True, exist_ok=True)
+        # 複数のプロセスが同時に保存しても壊れたファイルが読まれないように、一時ファイルから置き換える
+        temp_path: pathlib.Path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(
+                {
+                    'digest': digest,
+                    'options': self.__get_options(opt_by_dp),
+                    'num_strategies': k,
+                    'strategies': [
+                        [
+                            time,
+                            [
+                                [v.level.ep_pg[0], v.level.ep_pg[1], v.cumlative_num_gems]
+                                for v in vertices
+                            ],
+                        ]
+                        for vertices, time in strategies
+                    ],
+                },
+                f,
+            )
+        os.replace(temp_path, path)
+        self.__evict()
+
+    def solve(self,
+            digest: str,
+            opt_by_dp: OptimizerByDynamicProgramming | OptimizerByDynamicProgrammingWithArrays,
+            ) -> list[tuple[list[Vertex], float]]:
+        """保存済みならばそのチャートを返し、そうでなければ opt_by_dp.solve() で求めて保存してから返す"""
+        strategies: list[tuple[list[Vertex], float]] | None = self.get(digest, opt_by_dp)
+        if strategies is None:
+            strategies = opt_by_dp.solve()
+            self.put(digest, opt_by_dp, strategies)
+        return strategies
+
+    def __get_options(self,
+            opt_by_dp: OptimizerByDynamicProgramming | OptimizerByDynamicProgrammingWithArrays,
+            ) -> dict[str, Any]:
+        """チャートに影響するアルゴリズムの種類と設定( max_labels_per_vertex を除く)"""
+        return {
+            'engine': 'array' if isinstance(opt_by_dp, OptimizerByDynamicProgrammingWithArrays) else 'heap',
+            'prune_by_lower_bounds': getattr(opt_by_dp, 'prune_by_lower_bounds', False),
+            'time_scale': opt_by_dp.instance.time_scale,
+            # (経路を区別する場合は route_token の repr() で区別する)
+            'route_token': (
+                None if getattr(opt_by_dp, 'route_token', None) is None else
+                repr(getattr(opt_by_dp, 'route_token'))
+            ),
+        }
+
+    def __get_path(self,
+            digest: str,
+            opt_by_dp: OptimizerByDynamicProgramming | OptimizerByDynamicProgrammingWithArrays,
+            ) -> pathlib.Path:
+        """キーに対応するファイルのパス"""
+        key: str = hashlib.sha256(
+            json.dumps([digest, self.__get_options(opt_by_dp)], sort_keys=True).encode('utf-8')
+        ).hexdigest()
+        return self.folder / f'{key}.json'
+
+    def __evict(self) -> None:
+        """ファイルの合計サイズが max_bytes 以下になるまで、最後に使われた時刻が古いファイルから削除する"""
+        paths: list[tuple[float, int, pathlib.Path]] = sorted(
+            (p.stat().st_mtime, p.stat().st_size, p) for p in self.folder.glob('*.json')
+        )
+        total_bytes: int = sum(size for _, size, _ in paths)
+        for _, size, p in paths:
+            if total_bytes <= self.max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            total_bytes -= size
+# ----------------------------------------------------------------------
+# -----------------------------------------------------------------------------
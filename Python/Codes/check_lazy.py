@@ -0,0 +1,95 @@
+# Project
+# -----------------------------------------------------------------------------
+# Title   : Dynamic Programming for Optimal Speedrun Strategy Exploration
+# Author  : [Twitter] @samuelladoco  [Twitch] SLDCtwitch
+# Contents: Check of lazy enumeration of strategies against solving at once
+# -----------------------------------------------------------------------------
+
+
+# Import
+# -----------------------------------------------------------------------------
+from __future__ import annotations
+import itertools
+#
+from algorithm import OptimizerByDynamicProgramming
+from generator import SyntheticInstance
+from instance import CompiledInstance
+from rw import Reader
+# -----------------------------------------------------------------------------
+
+
+# Classes
+# -----------------------------------------------------------------------------
+# ----------------------------------------------------------------------
+class LazyEnumerationCheck:
+    """iter_strategies() で逐次列挙したチャートと、 solve() で求めたチャートの比較(クラスメソッドのみ)"""
+
+    @classmethod
+    def run(cls,
+            instance_names: list[str],
+            nums_strategies: list[int],
+            ) -> int:
+        """インスタンスと求めたいチャートの個数の組み合わせごとに比較し、累積時間の列が一致しなかった回数を返す"""
+        num_mismatches: int = 0
+        for instance_name in instance_names:
+            instance: CompiledInstance = CompiledInstance.from_levels(
+                [l for l in Reader.read_levels_and_moves(instance_name).values()]
+            ).without_unusable_moves()
+            for num_strategies in nums_strategies:
+                is_matched: bool = cls.check(instance, num_strategies)
+                print(f'{instance_name} k={num_strategies}: {"ok" if is_matched else "mismatch"}')
+                if is_matched is False:
+                    num_mismatches += 1
+        return num_mismatches
+
+    @classmethod
+    def check(cls,
+            instance: CompiledInstance,
+            num_strategies: int,
+            ) -> bool:
+        """
+        iter_strategies() の最初の num_strategies 個のチャートと、 solve() で求めたチャートの累積時間の列が一致するか
+        (累積時間が同じチャートの並び順は異なり得るため、累積時間だけを比較する)
+        """
+        times_lazy: list[float] = [
+            t for _, t in itertools.islice(
+                OptimizerByDynamicProgramming(instance, num_strategies).iter_strategies(), num_strategies,
+            )
+        ]
+        times_solved: list[float] = [
+            t for _, t in OptimizerByDynamicProgramming(instance, num_strategies).solve()
+        ]
+        return len(times_lazy) == len(times_solved) and all(
+            abs(t_l - t_s) <= OptimizerByDynamicProgramming._time_tolerance
+            for t_l, t_s in zip(times_lazy, times_solved)
+        )
+# ----------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+
+
+# Settings
+# -----------------------------------------------------------------------------
+# Names of instances (synthetic instances are generated as Input/Synthetic_lazy_<index>/)
+instance_names: list[str] = ['CTTT']
+# Synthetic instances (short episodes with many side levels exhaust paths of vertices early)
+synthetic_instances: list[SyntheticInstance] = [
+    SyntheticInstance(2, 2, 4, 2, 0.5, 4, seed=15),
+    SyntheticInstance(4, 1, 2, 3, 0.2, 2, seed=82),
+    SyntheticInstance(4, 2, 2, 0, 0.5, 3, seed=8),
+    SyntheticInstance(6, 1, 5, 2, 0.5, 3, seed=40),
+    SyntheticInstance(3, 12),
+]
+# Numbers of strategies
+nums_strategies: list[int] = [10, 30, 50]
+# -----------------------------------------------------------------------------
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    synthetic_names: list[str] = []
+    for index, synthetic_instance in enumerate(synthetic_instances):
+        synthetic_names.append(f'Synthetic_lazy_{index}')
+        synthetic_instance.write(synthetic_names[-1])
+    num_mismatches: int = LazyEnumerationCheck.run(instance_names + synthetic_names, nums_strategies)
+    assert num_mismatches == 0, f'{num_mismatches} 回一致しませんでした'
+# -----------------------------------------------------------------------------
@@ -0,0 +1,146 @@
+# Project
+# -----------------------------------------------------------------------------
+# Title   : Dynamic Programming for Optimal Speedrun Strategy Exploration
+# Author  : [Twitter] @samuelladoco  [Twitch] SLDCtwitch
+# Contents: Check of re-solving after changes of times against solving from scratch
+# -----------------------------------------------------------------------------
+
+
+# Import
+# -----------------------------------------------------------------------------
+from __future__ import annotations
+import itertools
+import random
+#
+from algorithm import OptimizerByDynamicProgramming
+from generator import SyntheticInstance
+from instance import CompiledInstance
+from level import Level
+from rw import Reader
+# -----------------------------------------------------------------------------
+
+
+# Classes
+# -----------------------------------------------------------------------------
+# ----------------------------------------------------------------------
+class ResolveCheck:
+    """resolve() で解き直したチャートと、変更後のインスタンスで solve() したチャートの比較(クラスメソッドのみ)"""
+
+    @classmethod
+    def run(cls,
+            instance_names: list[str],
+            nums_strategies: list[int],
+            num_trials: int,
+            num_changes: int,
+            seed: int,
+            ) -> int:
+        """
+        インスタンス、求めたいチャートの個数、下界による枝刈りの有無の組み合わせごとに、
+        クリア時間と移動時間を乱数で num_changes 個ずつ変更して num_trials 回比較し、累積時間の列が一致しなかった回数を返す
+        """
+        rng: random.Random = random.Random(seed)
+        num_mismatches: int = 0
+        for instance_name in instance_names:
+            levels: list[Level] = [l for l in Reader.read_levels_and_moves(instance_name).values()]
+            instance: CompiledInstance = CompiledInstance.from_levels(levels).without_unusable_moves()
+            level_times_old: dict[tuple[tuple[int, int], int], float] = {
+                (l.ep_pg, n): t for l in levels for n, t in l.times.items() if t != float('inf')
+            }
+            move_keys: list[tuple[tuple[int, int], tuple[int, int]]] = [
+                (l.ep_pg, l_next.ep_pg) for l in levels for l_next in l.get_next_levels_and_times().keys()
+            ]
+            for num_strategies, prune_by_lower_bounds in itertools.product(nums_strategies, [False, True]):
+                opt_by_dp: OptimizerByDynamicProgramming = OptimizerByDynamicProgramming(
+                    instance, num_strategies, prune_by_lower_bounds,
+                )
+                opt_by_dp.solve()
+                num_mismatches_this: int = 0
+                for _ in range(num_trials):
+                    # 短くも長くもなるように、元の時間の 0.5 ～ 1.5 倍にする
+                    level_times: dict[tuple[tuple[int, int], int], float] = {
+                        key: round(level_times_old[key] * rng.uniform(0.5, 1.5), 2)
+                        for key in rng.sample(list(level_times_old), min(num_changes, len(level_times_old)))
+                    }
+                    move_times: dict[tuple[tuple[int, int], tuple[int, int]], float] = {
+                        key: round(rng.uniform(0.0, 10.0), 2)
+                        for key in rng.sample(move_keys, min(num_changes, len(move_keys)))
+                    }
+                    if cls.check(opt_by_dp, level_times, move_times) is False:
+                        num_mismatches_this += 1
+                print(
+                    f'{instance_name} k={num_strategies} prune={prune_by_lower_bounds}: ' +
+                    f'{num_mismatches_this} / {num_trials} mismatches'
+                )
+                num_mismatches += num_mismatches_this
+        return num_mismatches
+
+    @classmethod
+    def check(cls,
+            opt_by_dp: OptimizerByDynamicProgramming,
+            level_times: dict[tuple[tuple[int, int], int], float] | None = None,
+            move_times: dict[tuple[tuple[int, int], tuple[int, int]], float] | None = None,
+            ) -> bool:
+        """
+        solve() 済みの opt_by_dp を resolve() で解き直したチャートと、変更後のインスタンスで solve() したチャートの
+        累積時間の列が一致するか
+        (累積時間が同じチャートの並び順はラベルの通し番号によって異なり得るため、累積時間だけを比較する)
+        """
+        times_resolved: list[float] = [
+            t for _, t in opt_by_dp.resolve(level_times, move_times).get_strategies()
+        ]
+        times_solved: list[float] = [
+            t for _, t in OptimizerByDynamicProgramming(
+                opt_by_dp.instance.with_times(level_times, move_times)[0],
+                opt_by_dp.max_labels_per_vertex, opt_by_dp.prune_by_lower_bounds,
+            ).solve()
+        ]
+        return len(times_resolved) == len(times_solved) and all(
+            abs(t_r - t_s) <= OptimizerByDynamicProgramming._time_tolerance
+            for t_r, t_s in zip(times_resolved, times_solved)
+        )
+# ----------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+
+
+# Settings
+# -----------------------------------------------------------------------------
+# Names of instances (synthetic instances are generated as Input/Synthetic_check_s<seed>/)
+instance_names: list[str] = ['CTTT']
+# Seeds of synthetic instances
+synthetic_seeds: list[int] = [0, 1]
+# Numbers of strategies
+nums_strategies: list[int] = [1, 20]
+# Number of random changes of times for each instance and number of strategies
+num_trials: int = 20
+# Number of changed clear times and changed move times in each change
+num_changes: int = 3
+# Seed of random changes
+seed: int = 0
+# Fixed changes of clear times checked with pruning by lower bounds: (instance name, number of strategies, clear times)
+fixed_changes: list[tuple[str, int, dict[tuple[tuple[int, int], int], float]]] = [
+    ('CTTT', 20, {((3, 4), 3): 82.85, ((3, 19), 2): 67.53}),
+]
+# -----------------------------------------------------------------------------
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    for synthetic_seed in synthetic_seeds:
+        SyntheticInstance(3, 20, seed=synthetic_seed).write(f'Synthetic_check_s{synthetic_seed}')
+    num_mismatches: int = ResolveCheck.run(
+        instance_names + [f'Synthetic_check_s{s}' for s in synthetic_seeds],
+        nums_strategies, num_trials, num_changes, seed,
+    )
+    for instance_name, num_strategies, level_times in fixed_changes:
+        opt_by_dp: OptimizerByDynamicProgramming = OptimizerByDynamicProgramming(
+            CompiledInstance.from_levels(
+                [l for l in Reader.read_levels_and_moves(instance_name).values()]
+            ).without_unusable_moves(),
+            num_strategies, True,
+        )
+        opt_by_dp.solve()
+        if ResolveCheck.check(opt_by_dp, level_times) is False:
+            print(f'{instance_name} k={num_strategies} {level_times}: mismatch')
+            num_mismatches += 1
+    assert num_mismatches == 0, f'{num_mismatches} 回一致しませんでした'
+# -----------------------------------------------------------------------------
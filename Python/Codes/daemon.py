@@ -0,0 +1,269 @@
+# Project
+# -----------------------------------------------------------------------------
+# Title   : Dynamic Programming for Optimal Speedrun Strategy Exploration
+# Author  : [Twitter] @samuelladoco  [Twitch] SLDCtwitch
+# Contents: Long-running local solver service
+# -----------------------------------------------------------------------------
+
+
+# Import
+# -----------------------------------------------------------------------------
+from __future__ import annotations
+import asyncio
+import collections
+import concurrent.futures
+import json
+import socket
+from typing import Any, ClassVar
+#
+from algorithm import OptimizerByDynamicProgramming, Vertex
+from instance import CompiledInstance
+from level import Level
+from rw import Reader, Writer
+# -----------------------------------------------------------------------------
+
+
+# Classes
+# -----------------------------------------------------------------------------
+# ----------------------------------------------------------------------
+class SolverService:
+    """
+    インスタンスと解いた最適化オブジェクトをメモリに保持し続け、ローカルのソケットで受けた要求に答える常駐サービス(クラスメソッドのみ)
+
+    要求と応答は 1 行 1 個の JSON オブジェクトで、接続ごとに何個でも続けて送れる。
+    要求は asyncio で受け付け、動的計画法はプロセスプールのワーカーで実行する
+    (各ワーカーは一度読み込んだインスタンスと解いた最適化オブジェクトを保持し、次からはそれを使う)。
+
+    要求の例
+    --------
+    {"command": "ping"}
+    {"command": "solve", "instance_name": "CTTT", "num_strategies": 11}
+    {"command": "solve", "instance_name": "CTTT", "num_strategies": 11,
+     "level_times": [[1, 2, 0, 42.5]], "move_times": [[1, 1, 1, 2, 0.9]]}
+        level_times は [エピソード番号, ページ番号, ダイヤ取得数, クリア時間] の、
+        move_times は [移動元のエピソード番号, 移動元のページ番号, 移動先のエピソード番号, 移動先のページ番号, 移動時間] のリストで、
+        与えた場合は保持している最適化オブジェクトから resolve() で解き直す
+        (枝刈りしたラベルは引き継げないため、この場合 prune_by_lower_bounds は無視する)
+    {"command": "solve", "instance_name": "CTTT", "num_strategies": 1,
+     "start": [2, 5, 37], "elapsed_time": 1234.5}
+        start は最後にクリアした面の [エピソード番号, ページ番号, その時点のダイヤ数] で、
+        与えた場合はその面をクリアした時点の累積時間(秒)を elapsed_time として solve_from() で残りのチャートを求める
+        (level_times, move_times も与えた場合は、変更後の時間で求める)
+
+    応答は {"status": "ok", "rows": [[順位, 時間差, 時間, チャート], ...]} ( Solutions ファイルの行と同じ)か、
+    {"status": "error", "message": "..."}
+    (不正な要求は python -O で実行した場合も ValueError としてエラーの応答にする)
+    """
+
+    # 各ワーカーが保持する最適化オブジェクトの個数の上限(超えた場合は最も長く使われていないものから捨てる)
+    max_optimizers: ClassVar[int] = 8
+
+    # 読み込んだインスタンス(キーは (インスタンス名, time_scale) で、残り時間の表もインスタンスごとに保持される)
+    __instances: ClassVar[dict[tuple[str, int | None], CompiledInstance]] = {}
+    # 解いた最適化オブジェクト(キーは (インスタンス名, 求めたいチャートの個数, 枝刈りするか, time_scale) )
+    # (使われた順に並べ、最後が最も新しく使われたもの)
+    __optimizers: ClassVar[collections.OrderedDict[tuple[str, int, bool, int | None], OptimizerByDynamicProgramming]] = (
+        collections.OrderedDict()
+    )
+
+    @classmethod
+    def preload(cls, instance_names: list[str]) -> None:
+        """インスタンスを読み込んでおく(サービスの起動前に呼ぶと fork で作られたワーカーもそれを共有する)"""
+        for instance_name in instance_names:
+            cls.__get_instance(instance_name)
+
+    @classmethod
+    def handle(cls, request: dict[str, Any]) -> dict[str, Any]:
+        """1つの要求に答える(ワーカーのプロセスで実行される)"""
+        try:
+            command: str = request.get('command', 'solve')
+            if command == 'ping':
+                return {'status': 'ok'}
+            if command != 'solve':
+                raise ValueError(f'{command} は未知のコマンドです')
+            return cls.__solve(request)
+        except (AssertionError, KeyError, OSError, TypeError, ValueError) as e:
+            return {'status': 'error', 'message': f'{type(e).__name__}: {e}'}
+
+    @classmethod
+    async def serve(cls,
+            host: str,
+            port: int,
+            max_workers: int | None = None,
+            ) -> None:
+        """host:port で要求を受け付け続ける"""
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+
+            async def on_connected(
+                    reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                    ) -> None:
+                """1つの接続の要求に順に答える"""
+                try:
+                    while (line := await reader.readline()) != b'':
+                        response: dict[str, Any]
+                        try:
+                            request: Any = json.loads(line)
+                            if not isinstance(request, dict):
+                                raise ValueError(f'要求が JSON オブジェクトではありません')
+                        except ValueError as e:
+                            response = {'status': 'error', 'message': f'{type(e).__name__}: {e}'}
+                        else:
+                            # ワーカーで想定外の例外が起きても、接続は切らずにエラーとして答える
+                            try:
+                                response = await loop.run_in_executor(executor, cls.handle, request)
+                            except Exception as e:
+                                response = {'status': 'error', 'message': f'{type(e).__name__}: {e}'}
+                        writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                        await writer.drain()
+                finally:
+                    writer.close()
+
+            server: asyncio.Server = await asyncio.start_server(on_connected, host, port)
+            async with server:
+                await server.serve_forever()
+
+    @classmethod
+    def request(cls,
+            host: str,
+            port: int,
+            request: dict[str, Any],
+            ) -> dict[str, Any]:
+        """サービスに要求を1つ送り、応答を返す(クライアント用)"""
+        with socket.create_connection((host, port)) as s:
+            s.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            with s.makefile('rb') as f:
+                return json.loads(f.readline())
+
+    @classmethod
+    def __solve(cls, request: dict[str, Any]) -> dict[str, Any]:
+        """solve コマンドに答える"""
+        instance_name: str = request['instance_name']
+        num_strategies: int = int(request['num_strategies'])
+        prune_by_lower_bounds: bool = bool(request.get('prune_by_lower_bounds', False))
+        time_scale: int | None = request.get('time_scale')
+        if num_strategies < 1:
+            raise ValueError(f'num_strategies {num_strategies} は 1 以上ではありません')
+        if time_scale is not None and (not isinstance(time_scale, int) or time_scale < 1):
+            raise ValueError(f'time_scale {time_scale} は None または 1 以上の整数ではありません')
+        #
+        # 時間の変更
+        level_times: dict[tuple[tuple[int, int], int], float] = {
+            ((int(ep), int(pg)), int(num_gems)): float(time)
+            for ep, pg, num_gems, time in request.get('level_times', [])
+        }
+        move_times: dict[tuple[tuple[int, int], tuple[int, int]], float] = {
+            ((int(ep_from), int(pg_from)), (int(ep_to), int(pg_to))): float(time)
+            for ep_from, pg_from, ep_to, pg_to, time in request.get('move_times', [])
+        }
+        cls.__validate_times(cls.__get_instance(instance_name), level_times, move_times)
+        strategies: list[tuple[list[Vertex], float]]
+        # 途中の頂点から求める場合(全体は解かない)
+        if 'start' in request.keys():
+            ep, pg, num_gems = request['start']
+            instance: CompiledInstance = cls.__get_instance(instance_name, time_scale)
+            level_start: Level = cls.__get_level(instance, (int(ep), int(pg)))
+            if not 0 <= int(num_gems) <= instance.max_required_gems:
+                raise ValueError(
+                    f'ダイヤ数 {num_gems} は 0 以上 {instance.max_required_gems} 以下ではありません'
+                )
+            if len(level_times) > 0 or len(move_times) > 0:
+                instance = instance.with_times(level_times, move_times)[0]
+            elapsed_time: float = float(request.get('elapsed_time', 0.0))
+            strategies = OptimizerByDynamicProgramming(
+                instance, num_strategies, prune_by_lower_bounds,
+            ).solve_from(
+                Vertex(level_start, int(num_gems)),
+                elapsed_time if time_scale is None else round(elapsed_time * time_scale),
+            )
+        else:
+            # 時間の変更がある場合は、枝刈りしていない最適化オブジェクトから解き直す
+            # (枝刈りしたラベルは変更前の下界で枝刈りされているため、引き継ぐと上位のチャートが欠けることがある)
+            if len(level_times) > 0 or len(move_times) > 0:
+                prune_by_lower_bounds = False
+            key: tuple[str, int, bool, int | None] = (
+                instance_name, num_strategies, prune_by_lower_bounds, time_scale,
+            )
+            if key not in cls.__optimizers.keys():
+                opt_by_dp: OptimizerByDynamicProgramming = OptimizerByDynamicProgramming(
+                    cls.__get_instance(instance_name, time_scale),
+                    num_strategies, prune_by_lower_bounds,
+                )
+                opt_by_dp.solve()
+                cls.__optimizers[key] = opt_by_dp
+                # 上限を超えた場合は、最も長く使われていない最適化オブジェクトを捨てる
+                while len(cls.__optimizers) > cls.max_optimizers:
+                    cls.__optimizers.popitem(last=False)
+            cls.__optimizers.move_to_end(key)
+            opt_by_dp = cls.__optimizers[key]
+            # 時間の変更がある場合は解き直す(保持している最適化オブジェクトは変更されない)
+            if len(level_times) > 0 or len(move_times) > 0:
+                opt_by_dp = opt_by_dp.resolve(level_times, move_times)
+            strategies = opt_by_dp.get_strategies()
+        return {
+            'status': 'ok',
+            'rows': [r for r in Writer.get_strategy_rows(strategies, time_scale)],
+        }
+
+    @classmethod
+    def __validate_times(cls,
+            instance: CompiledInstance,
+            level_times: dict[tuple[tuple[int, int], int], float],
+            move_times: dict[tuple[tuple[int, int], tuple[int, int]], float],
+            ) -> None:
+        """変更するクリア時間と移動時間が元のインスタンスにあるものかを確かめる(ない場合は ValueError )"""
+        for ep_pg, num_gems in level_times.keys():
+            if cls.__get_level(instance, ep_pg).times.get(num_gems, float('inf')) == float('inf'):
+                raise ValueError(f'{ep_pg} でダイヤ取得数 {num_gems} のクリア時間はありません')
+        for ep_pg_from, ep_pg_to in move_times.keys():
+            if cls.__get_level(instance, ep_pg_to) not in (
+                    cls.__get_level(instance, ep_pg_from).get_next_levels_and_times().keys()):
+                raise ValueError(f'{ep_pg_from} から {ep_pg_to} への移動はありません')
+
+    @classmethod
+    def __get_level(cls, instance: CompiledInstance, ep_pg: tuple[int, int]) -> Level:
+        """(エピソード番号, ページ番号) の面を取得する(ない場合は ValueError )"""
+        for l in instance.levels:
+            if l.ep_pg == ep_pg:
+                return l
+        raise ValueError(f'{ep_pg} の面はありません')
+
+    @classmethod
+    def __get_instance(cls,
+            instance_name: str, time_scale: int | None = None,
+            ) -> CompiledInstance:
+        """インスタンスを(このプロセスで未読込の場合は読み込んで)取得する"""
+        if (instance_name, None) not in cls.__instances.keys():
+            # (使われ得ない移動は、チャートが変わらないので取り除いておく)
+            cls.__instances[instance_name, None] = CompiledInstance.from_levels([
+                l for l in Reader.read_levels_and_moves_compiled(instance_name).values()
+            ]).without_unusable_moves()
+        if (instance_name, time_scale) not in cls.__instances.keys():
+            cls.__instances[instance_name, time_scale] = (
+                cls.__instances[instance_name, None].with_time_scale(time_scale)
+            )
+        return cls.__instances[instance_name, time_scale]
+# ----------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+
+
+# Settings
+# -----------------------------------------------------------------------------
+# Address of service (only localhost is expected)
+host: str = '127.0.0.1'
+port: int = 8617
+# Number of worker processes (None: number of CPUs)
+max_workers: int | None = None
+# Instances read before start of service
+instance_names: list[str] = ['CTTT']
+# Maximum number of solved optimizers kept in each worker (least recently used one dropped first)
+max_optimizers: int = 8
+# -----------------------------------------------------------------------------
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    SolverService.max_optimizers = max_optimizers
+    SolverService.preload(instance_names)
+    asyncio.run(SolverService.serve(host, port, max_workers))
+# -----------------------------------------------------------------------------
@@ -0,0 +1,274 @@
+# Project
+# -----------------------------------------------------------------------------
+# Title   : Dynamic Programming for Optimal Speedrun Strategy Exploration
+# Author  : [Twitter] @samuelladoco  [Twitch] SLDCtwitch
+# Contents: Monte Carlo evaluation of strategies under variance of clear times
+# -----------------------------------------------------------------------------
+
+
+# Import
+# -----------------------------------------------------------------------------
+from __future__ import annotations
+import dataclasses
+import numpy as np
+#
+from algorithm import Vertex
+# -----------------------------------------------------------------------------
+
+
+# Classes
+# -----------------------------------------------------------------------------
+# ----------------------------------------------------------------------
+@dataclasses.dataclass(frozen=True, )
+class SplitTimeDistributions:
+    """
+    各 (面, ダイヤ取得数) のクリア時間のばらつき(どちらにもない場合はクリア時間を Level.times の値で確定とする)
+
+    Parameters
+    ----------
+    stds : dict[tuple[tuple[int, int], int], float]
+        ((エピソード番号, ページ番号), ダイヤ取得数) をキーとする、クリア時間の標準偏差
+        (平均が Level.times の値の正規分布とみなす)
+    samples : dict[tuple[tuple[int, int], int], list[float]]
+        ((エピソード番号, ページ番号), ダイヤ取得数) をキーとする、クリア時間の実測値のリスト
+        (経験分布とみなし、 stds より優先する)
+    """
+    stds: dict[tuple[tuple[int, int], int], float] = dataclasses.field(default_factory=dict)
+    samples: dict[tuple[tuple[int, int], int], list[float]] = dataclasses.field(default_factory=dict)
+# ----------------------------------------------------------------------
+
+# ----------------------------------------------------------------------
+@dataclasses.dataclass(frozen=True, )
+class StrategyEvaluation:
+    """
+    1つのチャートの時間のシミュレーションの結果(時間は秒単位)
+
+    Parameters
+    ----------
+    time : float
+        動的計画法での(クリア時間を確定とした)時間
+    mean : float
+        時間の平均
+    std : float
+        時間の標準偏差
+    percentiles : dict[float, float]
+        パーセント点をキーとする時間のパーセンタイル(ヒストグラムから線形補間で求めた近似値)
+    probability_of_beating_target : float | None
+        時間が目標時間より短い確率(目標時間がない場合は None )
+    """
+    time: float
+    mean: float
+    std: float
+    percentiles: dict[float, float]
+    probability_of_beating_target: float | None
+# ----------------------------------------------------------------------
+
+# ----------------------------------------------------------------------
+@dataclasses.dataclass(frozen=True, )
+class MonteCarloEvaluator:
+    """
+    クリア時間のばらつきの下で、求めたチャートたちの時間を num_samples 回の走行でシミュレーションする
+
+    全てのチャートで同じ乱数を使い(共通乱数法)、各回の走行では面ごとに1つの乱数を引く
+    (同じ面ではダイヤ取得数が違っても同じ乱数を使うため、正規分布では標準化した値、経験分布では分位点が等しくなる)。
+    走行は chunk_size 回ずつまとめて行列で計算し、全てのチャートが通る (面, ダイヤ取得数) の時間は1回だけ足し、
+    残りは (チャート数, 残りの (面, ダイヤ取得数) の個数) の 0/1 行列との積で足す。
+    パーセンタイルは全ての走行を保持せずに、チャートごとの num_bins 個の区間のヒストグラムから求める
+    (区間の範囲は最初の chunk_size 回の走行から決め、範囲外の時間は両端の区間に数える)
+
+    Parameters
+    ----------
+    distributions : SplitTimeDistributions
+        各 (面, ダイヤ取得数) のクリア時間のばらつき
+    num_samples : int
+        シミュレーションする走行の回数
+    chunk_size : int
+        まとめて計算する走行の回数
+    num_bins : int
+        パーセンタイルを求めるヒストグラムの区間の個数
+    percentiles : tuple[float, ...]
+        求めるパーセンタイルのパーセント点
+    target_time : float | None
+        目標時間(秒)(None の場合は目標時間より短い確率を求めない)
+    seed : int
+        乱数のシード
+    """
+    distributions: SplitTimeDistributions
+    num_samples: int = 1_000_000
+    chunk_size: int = 2_000
+    num_bins: int = 1024
+    percentiles: tuple[float, ...] = (5.0, 50.0, 95.0)
+    target_time: float | None = None
+    seed: int = 0
+
+    def evaluate(self,
+            strategies: list[tuple[list[Vertex], float]],
+            time_scale: int | None = None,
+            from_start_vertex: bool = False,
+            ) -> list[StrategyEvaluation]:
+        """
+        strategies の各チャートを評価する
+
+        time_scale が None でない場合、 strategies の時間は 1 / time_scale 秒単位の整数とする。
+        from_start_vertex が True の場合( solve_from() で求めたチャート)、最初の頂点の面はクリア済みとしてばらつきを考えない
+        """
+        num_strategies: int = len(strategies)
+        if num_strategies == 0:
+            return []
+        times: np.ndarray = np.array(
+            [t if time_scale is None else t / time_scale for _, t in strategies],
+            dtype=np.float64,
+        )
+
+        # 時間がばらつく (面, ダイヤ取得数) に番号を付け、各チャートが通るものを 0/1 行列にする
+        # (時間は Level.times の値からの差として扱う)
+        # (正規分布の標準偏差と経験分布の実測値の差は、 (面, ダイヤ取得数) の番号とともに別々に保持する)
+        item_ids: dict[tuple[tuple[int, int], int], int] = {}
+        normal_ids: list[int] = []
+        normal_deviations: list[float] = []
+        empirical_ids: list[int] = []
+        empirical_deviations: list[np.ndarray] = []
+        strategy_item_ids: list[list[int]] = []
+        for vertices, _ in strategies:
+            ids: list[int] = []
+            for index, v in enumerate(vertices):
+                if index == 0 and from_start_vertex:
+                    continue
+                num_gems: int = v.cumlative_num_gems - (
+                    vertices[index - 1].cumlative_num_gems if index > 0 else 0
+                )
+                key: tuple[tuple[int, int], int] = (v.level.ep_pg, num_gems)
+                if key not in item_ids.keys():
+                    deviation: np.ndarray | float | None = self.__get_deviation(
+                        key, v.level.times[num_gems],
+                    )
+                    # 時間が確定している場合
+                    if deviation is None:
+                        continue
+                    item_ids[key] = len(item_ids)
+                    if isinstance(deviation, np.ndarray):
+                        empirical_ids.append(item_ids[key])
+                        empirical_deviations.append(deviation)
+                    else:
+                        normal_ids.append(item_ids[key])
+                        normal_deviations.append(deviation)
+                ids.append(item_ids[key])
+            strategy_item_ids.append(ids)
+        incidence: np.ndarray = np.zeros((num_strategies, len(item_ids)), dtype=np.float32)
+        for s, ids in enumerate(strategy_item_ids):
+            incidence[s, ids] = 1.0
+        is_common: np.ndarray = incidence.sum(axis=0) == num_strategies
+        incidence_variable: np.ndarray = np.ascontiguousarray(incidence[:, ~is_common])
+
+        # 正規分布の (面, ダイヤ取得数) と経験分布の (面, ダイヤ取得数) ごとに、使う乱数の行(面ごと)を決める
+        keys: list[tuple[tuple[int, int], int]] = [k for k in item_ids.keys()]
+        normal_levels: dict[tuple[int, int], int] = {}
+        normal_rows: np.ndarray = np.array(
+            [normal_levels.setdefault(keys[i][0], len(normal_levels)) for i in normal_ids],
+            dtype=np.intp,
+        )
+        normal_stds: np.ndarray = np.array(normal_deviations, dtype=np.float32).reshape(-1, 1)
+        empirical_levels: dict[tuple[int, int], int] = {}
+        empirical_rows: list[int] = [
+            empirical_levels.setdefault(keys[i][0], len(empirical_levels)) for i in empirical_ids
+        ]
+
+        # チャートごとの統計(時間は動的計画法での時間からの差)
+        sums: np.ndarray = np.zeros(num_strategies, dtype=np.float64)
+        sums_of_squares: np.ndarray = np.zeros(num_strategies, dtype=np.float64)
+        nums_beating: np.ndarray = np.zeros(num_strategies, dtype=np.int64)
+        histograms: np.ndarray = np.zeros(num_strategies * self.num_bins, dtype=np.int64)
+        bin_offsets: np.ndarray = (
+            np.arange(num_strategies, dtype=np.int64) * self.num_bins
+        ).reshape(-1, 1)
+        margins: np.ndarray = (
+            np.full(num_strategies, np.inf) if self.target_time is None else self.target_time - times
+        ).astype(np.float32).reshape(-1, 1)
+        lower: float = 0.0
+        bin_width: float = 1.0
+
+        rng: np.random.Generator = np.random.default_rng(self.seed)
+        for start in range(0, self.num_samples, self.chunk_size):
+            size: int = min(self.chunk_size, self.num_samples - start)
+            # 各 (面, ダイヤ取得数) の時間の差 (形状は ((面, ダイヤ取得数) の個数, size) )
+            samples: np.ndarray = np.empty((len(item_ids), size), dtype=np.float32)
+            if len(normal_ids) > 0:
+                z: np.ndarray = rng.standard_normal((len(normal_levels), size), dtype=np.float32)
+                samples[normal_ids] = z[normal_rows] * normal_stds
+            if len(empirical_ids) > 0:
+                u: np.ndarray = rng.random((len(empirical_levels), size), dtype=np.float32)
+                for i, row, deviations in zip(empirical_ids, empirical_rows, empirical_deviations):
+                    samples[i] = deviations[np.minimum(
+                        (u[row] * len(deviations)).astype(np.intp), len(deviations) - 1,
+                    )]
+            # 各チャートの時間の差 (形状は (チャート数, size) )
+            diffs: np.ndarray = incidence_variable @ samples[~is_common]
+            diffs += samples[is_common].sum(axis=0)
+            #
+            sums += diffs.sum(axis=1)
+            sums_of_squares += np.einsum('ij,ij->i', diffs, diffs)
+            nums_beating += np.count_nonzero(diffs < margins, axis=1)
+            # ヒストグラムの区間の範囲は最初の走行たちの範囲を両側に 25 % ずつ広げたものとする
+            if start == 0:
+                diff_min: float = float(diffs.min())
+                diff_max: float = float(diffs.max())
+                width: float = max(diff_max - diff_min, 1.0)
+                lower = diff_min - 0.25 * width
+                bin_width = 1.5 * width / self.num_bins
+            diffs -= lower
+            diffs *= 1.0 / bin_width
+            np.clip(diffs, 0, self.num_bins - 1, out=diffs)
+            bins: np.ndarray = diffs.astype(np.intp)
+            bins += bin_offsets
+            histograms += np.bincount(bins.ravel(), minlength=len(histograms))
+
+        means: np.ndarray = sums / self.num_samples
+        stds: np.ndarray = np.sqrt(np.maximum(sums_of_squares / self.num_samples - means ** 2, 0.0))
+        percentiles: dict[float, np.ndarray] = self.__compute_percentiles(
+            histograms.reshape(num_strategies, self.num_bins), lower, bin_width,
+        )
+        return [
+            StrategyEvaluation(
+                float(times[s]),
+                float(times[s] + means[s]),
+                float(stds[s]),
+                {p: float(times[s] + ps[s]) for p, ps in percentiles.items()},
+                None if self.target_time is None else float(nums_beating[s]) / self.num_samples,
+            )
+            for s in range(num_strategies)
+        ]
+
+    def __get_deviation(self,
+            key: tuple[tuple[int, int], int], time: float,
+            ) -> np.ndarray | float | None:
+        """
+        (面, ダイヤ取得数) の時間の Level.times の値 time からの差の分布を取得する
+        (経験分布は昇順に並べた差の配列、正規分布は標準偏差、確定している場合は None )
+        """
+        if key in self.distributions.samples.keys():
+            return np.sort(np.array(self.distributions.samples[key], dtype=np.float32) - np.float32(time))
+        std: float = self.distributions.stds.get(key, 0.0)
+        return float(std) if std > 0 else None
+
+    def __compute_percentiles(self,
+            histograms: np.ndarray, lower: float, bin_width: float,
+            ) -> dict[float, np.ndarray]:
+        """ヒストグラムから各チャートの時間の差のパーセンタイルを(区間内では一様として)求める"""
+        cumulative: np.ndarray = histograms.cumsum(axis=1)
+        rows: np.ndarray = np.arange(histograms.shape[0])
+        percentiles: dict[float, np.ndarray] = {}
+        for p in self.percentiles:
+            count: float = p / 100 * self.num_samples
+            bins: np.ndarray = np.minimum(
+                np.count_nonzero(cumulative < count, axis=1), self.num_bins - 1,
+            )
+            counts_in_bin: np.ndarray = histograms[rows, bins]
+            fractions: np.ndarray = np.where(
+                counts_in_bin > 0,
+                (count - (cumulative[rows, bins] - counts_in_bin)) / np.maximum(counts_in_bin, 1),
+                0.0,
+            )
+            percentiles[p] = lower + (bins + fractions) * bin_width
+        return percentiles
+# ----------------------------------------------------------------------
+# -----------------------------------------------------------------------------
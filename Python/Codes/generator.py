@@ -0,0 +1,178 @@
+# Project
+# -----------------------------------------------------------------------------
+# Title   : Dynamic Programming for Optimal Speedrun Strategy Exploration
+# Author  : [Twitter] @samuelladoco  [Twitch] SLDCtwitch
+# Contents: Generator of synthetic instances
+# -----------------------------------------------------------------------------
+
+
+# Import
+# -----------------------------------------------------------------------------
+from __future__ import annotations
+import dataclasses
+import random
+from typing import Any
+#
+from level import Level
+from rw import Csv, Reader, Writer, workspace_base_folder
+# -----------------------------------------------------------------------------
+
+
+# Classes
+# -----------------------------------------------------------------------------
+# ----------------------------------------------------------------------
+@dataclasses.dataclass(frozen=True, )
+class SyntheticInstance:
+    """
+    Reader で読み込める形式の Levels, Moves ファイルを乱数で生成する人工的なインスタンス
+
+    各エピソードは num_pages 個の本筋の面が一本道で並び、本筋の面は次の本筋の面に加えて
+    最大 branching 個の寄り道の面(クリアしても何も開放しない面)を開放する。
+    本筋の面のうち gate_interval 個ごとの面と最後の面には、それより手前の全ての面で取れるダイヤ数の
+    gate_ratio 倍の必要ダイヤ数を設ける。
+    寄り道の面はダイヤを 1 個以上、最終面はダイヤを 0 個しか取れない(取れない場合のクリア時間は impossible_time )
+
+    Parameters
+    ----------
+    num_episodes : int
+        エピソード数
+    num_pages : int
+        1 エピソードあたりの本筋の面の数
+    max_gems_per_level : int
+        1 面あたりの最大ダイヤ数
+    branching : int
+        1 つの本筋の面が開放する寄り道の面の最大数
+    branch_probability : float
+        本筋の面が寄り道の面を開放する確率
+    gate_interval : int
+        必要ダイヤ数を設ける本筋の面の間隔
+    gate_ratio : float
+        必要ダイヤ数の、手前の面で取れるダイヤ数に対する比率
+    impossible_time : float
+        そのダイヤ数を取れないことを表すクリア時間
+    seed : int
+        乱数のシード
+    """
+    num_episodes: int
+    num_pages: int
+    max_gems_per_level: int = 3
+    branching: int = 2
+    branch_probability: float = 0.3
+    gate_interval: int = 6
+    gate_ratio: float = 0.8
+    impossible_time: float = 9017.0
+    seed: int = 0
+
+    def write(self, instance_name: str) -> dict[tuple[int, int], Level]:
+        """Input/<instance_name>/ に Levels, Moves ファイルを書き込み、読み込んだ Level オブジェクトの集合を返す"""
+        folder = workspace_base_folder / 'Input' / instance_name
+        folder.mkdir(parents=True, exist_ok=True)
+        rng: random.Random = random.Random(self.seed)
+
+        # Levels ファイル
+        # (列は CTTT と同じく、末尾に名前のない空の列を持つ)
+        cols: list[str] = (
+            ['Episode', 'Page', 'Name', 'NumReqGems'] +
+            [f'Time_NumGems-{n}' for n in range(self.max_gems_per_level + 1)] +
+            [
+                c for u in range(1, self.branching + 2)
+                for c in (f'Unlock_Ep-{u}', f'Unlock_Pg-{u}')
+            ] +
+            ['']
+        )
+        rows: list[list[Any]] = []
+        num_gems_before: int = 0
+        for ep in range(1, self.num_episodes + 1):
+            # 本筋の面ごとの寄り道の面の数を決めてから、ページ番号を振る
+            num_branches: list[int] = [
+                rng.randint(1, self.branching)
+                if self.branching > 0 and rng.random() < self.branch_probability else 0
+                for _ in range(self.num_pages)
+            ]
+            pg: int = 1
+            for p, num_branch in enumerate(num_branches):
+                is_last_level: bool = ep == self.num_episodes and p == self.num_pages - 1
+                is_gate: bool = (
+                    is_last_level or
+                    (p + 1 + (ep - 1) * self.num_pages) % self.gate_interval == 0
+                )
+                # 本筋の面が開放する面(寄り道の面は直後のページに並べ、次の本筋の面はその後)
+                unlocks: list[tuple[int, int]] = [(ep, pg + 1 + b) for b in range(num_branch)]
+                if is_last_level is False:
+                    unlocks.append(
+                        (ep, pg + 1 + num_branch) if p < self.num_pages - 1 else (ep + 1, 1)
+                    )
+                rows.append(self.__create_row(
+                    rng, ep, pg,
+                    int(num_gems_before * self.gate_ratio) if is_gate else None,
+                    False, is_last_level, unlocks,
+                ))
+                num_gems_before += 0 if is_last_level else self.max_gems_per_level
+                # 寄り道の面
+                for b in range(num_branch):
+                    rows.append(self.__create_row(
+                        rng, ep, pg + 1 + b, None, True, False, [],
+                    ))
+                    num_gems_before += self.max_gems_per_level
+                pg += 1 + num_branch
+        Csv.write(folder / 'Levels.csv', cols, rows)
+
+        # Moves ファイル
+        # (移動時間は隣の面への 0.85 秒に、飛ばした面 1 つあたり 0.20 秒を加える)
+        levels: dict[tuple[int, int], Level] = Reader.read_levels_only(instance_name)
+        level_ids: dict[Level, int] = {l: i for i, l in enumerate(levels.values())}
+        Csv.write(
+            folder / 'Moves.csv',
+            ['Ep-From', 'Pg-From', 'Ep-To', 'Pg-To', 'Time', ''],
+            [
+                [
+                    l_from.ep_pg[0], l_from.ep_pg[1], l_to.ep_pg[0], l_to.ep_pg[1],
+                    f'{0.85 + 0.20 * (level_ids[l_to] - level_ids[l_from] - 1):.2f}', '',
+                ]
+                for l_from, l_to in Writer.get_moves_pks(levels)
+            ],
+        )
+        return Reader.read_levels_and_moves(instance_name)
+
+    def __create_row(self,
+            rng: random.Random,
+            ep: int, pg: int,
+            num_required_gems: int | None,
+            is_branch: bool,
+            is_last_level: bool,
+            unlocks: list[tuple[int, int]],
+            ) -> list[Any]:
+        """Levels ファイルの 1 行を作る(クリア時間はダイヤ数が多いほど長い)"""
+        times: list[float] = [rng.randint(40, 240) / 2]
+        for _ in range(self.max_gems_per_level):
+            times.append(times[-1] + rng.randint(0, 30) / 2)
+        if is_branch:
+            times[0] = self.impossible_time
+        if is_last_level:
+            times[1:] = [self.impossible_time] * self.max_gems_per_level
+        return (
+            [ep, pg, f'Level {ep}-{pg}', '' if num_required_gems is None else num_required_gems] +
+            [f'{t:.2f}' for t in times] +
+            [
+                e for u in range(self.branching + 1)
+                for e in (unlocks[u] if u < len(unlocks) else ('', ''))
+            ] +
+            ['']
+        )
+# ----------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+
+
+# Settings
+# -----------------------------------------------------------------------------
+# Name of instance to be generated (written to 'Input/<instance_name>/')
+instance_name: str = 'Synthetic'
+# Parameters of instance
+synthetic_instance: SyntheticInstance = SyntheticInstance(3, 20)
+# -----------------------------------------------------------------------------
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    synthetic_instance.write(instance_name)
+# -----------------------------------------------------------------------------
@@ -0,0 +1,485 @@
+# Project
+# -----------------------------------------------------------------------------
+# Title   : Dynamic Programming for Optimal Speedrun Strategy Exploration
+# Author  : [Twitter] @samuelladoco  [Twitch] SLDCtwitch
+# Contents: Compiled instance (integer-indexed arrays of levels and moves)
+# -----------------------------------------------------------------------------
+
+
+# Import
+# -----------------------------------------------------------------------------
+from __future__ import annotations
+import dataclasses
+import functools
+import numpy as np
+#
+from level import Level
+# -----------------------------------------------------------------------------
+
+
+# Classes
+# -----------------------------------------------------------------------------
+# ----------------------------------------------------------------------
+@dataclasses.dataclass(frozen=True, eq=False, )
+class CompiledInstance:
+    """
+    インスタンスを面の番号(手前の面から 0, 1, ...)で添字付けした配列に変換したもの
+
+    移動は移動元の面ごとにまとめた CSR 形式で保持する
+    (面 i からの移動は move_targets[move_offsets[i]:move_offsets[i + 1]] )。
+    探索済みの面への移動は動的計画法で使われないため、手前の面への移動は含まない。
+
+    Parameters
+    ----------
+    levels : list[Level]
+        (手前の面から並んだ)面のリスト
+    max_required_gems : int
+        開放に必要なダイヤ数が最も多い面の必要ダイヤ数
+    num_required_gems : np.ndarray
+        各面に入るのに必要なダイヤ数 (形状は (面数, ))
+    level_times : np.ndarray
+        各面でダイヤ取得数が列番号のときにクリアにかかる時間、取得できない場合は inf (形状は (面数, 1 面あたりの最大ダイヤ数 + 1))
+    move_offsets : np.ndarray
+        各面からの移動が move_targets, move_times で始まる位置 (形状は (面数 + 1, ))
+    move_targets : np.ndarray
+        各移動の移動先の面の番号 (形状は (移動数, ))
+    move_times : np.ndarray
+        各移動の移動時間 (形状は (移動数, ))
+    move_required_gems : np.ndarray
+        各移動の移動先の面を開放するのに必要なダイヤ数 (形状は (移動数, ))
+    moves_in_offsets : np.ndarray
+        各面への移動が moves_in_ids で始まる位置 (形状は (面数 + 1, ))
+    moves_in_ids : np.ndarray
+        移動先の面ごとに並べた移動の番号 (形状は (移動数, ))
+    state_offsets : np.ndarray
+        各面の状態(最初の面から到達でき、最終面まで到達できるダイヤ数)が状態の番号で始まる位置 (形状は (面数 + 1, ))
+    state_gems : np.ndarray
+        各状態のダイヤ数(面ごとに少ない順) (形状は (状態数, ))
+    state_ids : np.ndarray
+        各 (面の番号, ダイヤ数) の状態の番号、状態でない場合は -1 (形状は (面数, 最大必要ダイヤ数 + 1))
+    time_scale : int | None
+        None でない場合、動的計画法で使う時間を 1 / time_scale 秒単位の整数に変換する(例えば 100 ならセンチ秒)
+        ( level_times, move_times の値は秒単位のまま)
+    """
+    levels: list[Level]
+    max_required_gems: int
+    num_required_gems: np.ndarray
+    level_times: np.ndarray
+    move_offsets: np.ndarray
+    move_targets: np.ndarray
+    move_times: np.ndarray
+    move_required_gems: np.ndarray
+    moves_in_offsets: np.ndarray
+    moves_in_ids: np.ndarray
+    state_offsets: np.ndarray
+    state_gems: np.ndarray
+    state_ids: np.ndarray
+    time_scale: int | None = None
+
+    @classmethod
+    def from_levels(cls,
+            levels: list[Level],
+            time_scale: int | None = None,
+            ) -> CompiledInstance:
+        """(手前の面から並んだ) Level オブジェクトのリストから生成する"""
+        level_ids: dict[Level, int] = {l: i for i, l in enumerate(levels)}
+        num_required_gems, level_times = cls.__get_level_arrays(levels)
+
+        move_offsets: list[int] = [0]
+        move_targets: list[int] = []
+        move_times: list[float] = []
+        for i, l in enumerate(levels):
+            # get_next_levels_and_times() は手前の面から順に並んでいる
+            for l_to, time_move in l.get_next_levels_and_times().items():
+                j: int = level_ids[l_to]
+                if j > i:
+                    move_targets.append(j)
+                    move_times.append(time_move)
+            move_offsets.append(len(move_targets))
+
+        return cls.from_arrays(
+            levels,
+            num_required_gems,
+            level_times,
+            np.array(move_offsets, dtype=np.int64),
+            np.array(move_targets, dtype=np.int64),
+            np.array(move_times, dtype=np.float64),
+            time_scale,
+        )
+
+    @classmethod
+    def from_levels_and_moves_pks(cls,
+            levels: list[Level],
+            moves_pks: list[tuple[Level, Level]],
+            ) -> CompiledInstance:
+        """
+        (手前の面から並んだ) Level オブジェクトのリストと、 Moves ファイルの主キー (移動元の面, 移動先の面) のリストから、
+        移動時間を 0 として生成する(移動時間を決める前に、使われ得ない移動を調べるため)
+        """
+        level_ids: dict[Level, int] = {l: i for i, l in enumerate(levels)}
+        num_required_gems, level_times = cls.__get_level_arrays(levels)
+        moves: list[tuple[int, int]] = sorted(
+            (level_ids[l_from], level_ids[l_to]) for l_from, l_to in moves_pks
+            if level_ids[l_to] > level_ids[l_from]
+        )
+        move_sources: np.ndarray = np.array([i for i, _ in moves], dtype=np.int64)
+        return cls.from_arrays(
+            levels,
+            num_required_gems,
+            level_times,
+            np.concatenate([
+                [0], np.cumsum(np.bincount(move_sources, minlength=len(levels)))
+            ]).astype(np.int64),
+            np.array([j for _, j in moves], dtype=np.int64),
+            np.zeros(len(moves), dtype=np.float64),
+        )
+
+    @classmethod
+    def from_arrays(cls,
+            levels: list[Level],
+            num_required_gems: np.ndarray,
+            level_times: np.ndarray,
+            move_offsets: np.ndarray,
+            move_targets: np.ndarray,
+            move_times: np.ndarray,
+            time_scale: int | None = None,
+            ) -> CompiledInstance:
+        """面と移動の配列から、開放に必要なダイヤ数と移動先ごとの索引を計算して生成する"""
+        moves_in_ids: np.ndarray = np.argsort(move_targets, kind='stable')
+        moves_in_offsets: np.ndarray = np.searchsorted(
+            move_targets[moves_in_ids], np.arange(len(levels) + 1),
+        ).astype(np.int64)
+        move_required_gems: np.ndarray = num_required_gems[move_targets]
+        max_required_gems: int = int(num_required_gems.max())
+        # 状態(最初の面から到達でき、最終面まで到達できる (面の番号, ダイヤ数) )に手前から番号を付ける
+        is_state: np.ndarray = cls.__compute_reachable(
+            level_times, move_offsets, move_targets, move_required_gems,
+            max_required_gems, False,
+        ) & cls.__compute_reachable(
+            level_times, move_offsets, move_targets, move_required_gems,
+            max_required_gems, True,
+        )
+        state_ids: np.ndarray = np.full(is_state.shape, -1, dtype=np.int64)
+        state_ids[is_state] = np.arange(int(is_state.sum()))
+        state_offsets: np.ndarray = np.concatenate(
+            [[0], np.cumsum(is_state.sum(axis=1))]
+        ).astype(np.int64)
+        state_gems: np.ndarray = np.nonzero(is_state)[1].astype(np.int64)
+        for a in (num_required_gems, level_times, move_offsets, move_targets,
+                move_times, move_required_gems, moves_in_ids, moves_in_offsets,
+                state_offsets, state_gems, state_ids):
+            a.setflags(write=False)
+        return cls(
+            levels,
+            max_required_gems,
+            num_required_gems,
+            level_times,
+            move_offsets,
+            move_targets,
+            move_times,
+            move_required_gems,
+            moves_in_offsets,
+            moves_in_ids,
+            state_offsets,
+            state_gems,
+            state_ids,
+            time_scale,
+        )
+
+    @staticmethod
+    def __get_level_arrays(levels: list[Level]) -> tuple[np.ndarray, np.ndarray]:
+        """各面に入るのに必要なダイヤ数と、ダイヤ取得数ごとのクリア時間(取得できない場合は inf )の配列を作る"""
+        max_gems_per_l: int = max(max(l.times.keys()) for l in levels)
+        num_required_gems: np.ndarray = np.array(
+            [l.num_required_gems for l in levels], dtype=np.int64,
+        )
+        level_times: np.ndarray = np.full((len(levels), max_gems_per_l + 1), np.inf)
+        for i, l in enumerate(levels):
+            for num_gems, time in l.times.items():
+                level_times[i, num_gems] = time
+        return num_required_gems, level_times
+
+    @staticmethod
+    def __compute_reachable(
+            level_times: np.ndarray,
+            move_offsets: np.ndarray,
+            move_targets: np.ndarray,
+            move_required_gems: np.ndarray,
+            max_required_gems: int,
+            backward: bool,
+            ) -> np.ndarray:
+        """
+        各 (面の番号, ダイヤ数) について、最初の面から到達できるか(backward が True の場合は (最終面, 最大必要ダイヤ数) に到達できるか)を求める
+        (クリア時間の値には依らず、面と移動のつながりと必要ダイヤ数だけで決まる)
+        """
+        num_levels: int = level_times.shape[0]
+        num_rows: int = max_required_gems + 1
+        gems_per_level: list[list[int]] = [
+            [n for n, t in enumerate(ts) if t != np.inf] for ts in level_times.tolist()
+        ]
+        reachable: np.ndarray = np.zeros((num_levels, num_rows), dtype=bool)
+        if backward:
+            reachable[-1, -1] = True
+        else:
+            reachable[0, [n for n in gems_per_level[0] if n < num_rows]] = True
+        level_ids: range = (
+            range(num_levels - 2, -1, -1) if backward else range(num_levels)
+        )
+        for i in level_ids:
+            for e in range(int(move_offsets[i]), int(move_offsets[i + 1])):
+                j: int = int(move_targets[e])
+                row_from_min: int = max(int(move_required_gems[e]), 0)
+                for num_gems_next in gems_per_level[j]:
+                    row_from_max: int = num_rows - num_gems_next
+                    if row_from_min >= row_from_max:
+                        continue
+                    rows_from: slice = slice(row_from_min, row_from_max)
+                    rows_to: slice = slice(row_from_min + num_gems_next, num_rows)
+                    if backward:
+                        reachable[i, rows_from] |= reachable[j, rows_to]
+                    else:
+                        reachable[j, rows_to] |= reachable[i, rows_from]
+        return reachable
+
+    @property
+    def num_levels(self) -> int:
+        """面数"""
+        return len(self.levels)
+
+    @property
+    def num_states(self) -> int:
+        """状態数"""
+        return len(self.state_gems)
+
+    def get_state_levels(self) -> np.ndarray:
+        """各状態の面の番号 (形状は (状態数, ))"""
+        return np.repeat(np.arange(self.num_levels), np.diff(self.state_offsets))
+
+    def get_state_costs_to_go(self) -> list[float]:
+        """各状態から (最終面, 最大必要ダイヤ数) までの最短の残り時間のリストを取得する"""
+        costs: np.ndarray = self.costs_to_go[self.get_state_levels(), self.state_gems]
+        # 状態は最終面まで到達できるので、残り時間は常に有限
+        return (costs if self.time_scale is None else costs.astype(np.int64)).tolist()
+
+    def with_time_scale(self, time_scale: int | None) -> CompiledInstance:
+        """動的計画法で使う時間の単位を変更したインスタンスを返す"""
+        return dataclasses.replace(self, time_scale=time_scale)
+
+    def get_usable_moves(self) -> np.ndarray:
+        """
+        各移動が、いずれかの状態から状態への移動になるか(最初の面から最終面までのいずれかのチャートで使われ得るか)を求める
+        (形状は (移動数, ) で、状態と同じくクリア時間の値には依らず、面と移動のつながりと必要ダイヤ数だけで決まる)
+        """
+        num_rows: int = self.max_required_gems + 1
+        is_state: np.ndarray = self.state_ids >= 0
+        gems_per_level: list[list[int]] = [
+            [n for n, t in enumerate(ts) if t != np.inf] for ts in self.level_times.tolist()
+        ]
+        usable: np.ndarray = np.zeros(len(self.move_targets), dtype=bool)
+        for i in range(self.num_levels):
+            for e in range(int(self.move_offsets[i]), int(self.move_offsets[i + 1])):
+                j: int = int(self.move_targets[e])
+                row_from_min: int = max(int(self.move_required_gems[e]), 0)
+                for num_gems_next in gems_per_level[j]:
+                    row_from_max: int = num_rows - num_gems_next
+                    if row_from_min >= row_from_max:
+                        continue
+                    if np.any(
+                            is_state[i, row_from_min:row_from_max] &
+                            is_state[j, row_from_min + num_gems_next:]):
+                        usable[e] = True
+                        break
+        return usable
+
+    def without_unusable_moves(self) -> CompiledInstance:
+        """
+        いずれのチャートでも使われ得ない移動( get_usable_moves() が False の移動)を取り除いたインスタンスを返す
+        (状態は変わらないため、動的計画法の結果も変わらない)
+        """
+        usable: np.ndarray = self.get_usable_moves()
+        if bool(usable.all()) is True:
+            return self
+        move_sources: np.ndarray = np.repeat(
+            np.arange(self.num_levels), np.diff(self.move_offsets),
+        )
+        return CompiledInstance.from_arrays(
+            self.levels,
+            self.num_required_gems,
+            self.level_times,
+            np.concatenate([
+                [0], np.cumsum(np.bincount(move_sources[usable], minlength=self.num_levels))
+            ]).astype(np.int64),
+            self.move_targets[usable],
+            self.move_times[usable],
+            self.time_scale,
+        )
+
+    def get_level_id(self, ep_pg: tuple[int, int]) -> int:
+        """(エピソード番号, ページ番号) の面の番号を取得する"""
+        for i, l in enumerate(self.levels):
+            if l.ep_pg == ep_pg:
+                return i
+        assert False, f'{ep_pg} の面はありません'
+
+    def get_move_id(self, level_id: int, level_next_id: int) -> int:
+        """面の番号 level_id から level_next_id への移動の番号を取得する"""
+        move_id: int = self.__find_move_id(level_id, level_next_id)
+        assert move_id >= 0, (
+            f'{self.levels[level_id].ep_pg} から ' +
+            f'{self.levels[level_next_id].ep_pg} への移動はありません'
+        )
+        return move_id
+
+    def __find_move_id(self, level_id: int, level_next_id: int) -> int:
+        """面の番号 level_id から level_next_id への移動の番号を取得する(ない場合は -1 )"""
+        for e in range(int(self.move_offsets[level_id]), int(self.move_offsets[level_id + 1])):
+            if int(self.move_targets[e]) == level_next_id:
+                return e
+        return -1
+
+    def with_times(self,
+            level_times: dict[tuple[tuple[int, int], int], float] | None = None,
+            move_times: dict[tuple[tuple[int, int], tuple[int, int]], float] | None = None,
+            ) -> tuple[CompiledInstance, int]:
+        """
+        クリア時間と移動時間の一部を変更したインスタンスと、変更の影響を受ける最も手前の面の番号を返す
+        ( levels の Level オブジェクトは変更されないため、時間は配列の値が正となる)
+
+        Parameters
+        ----------
+        level_times : dict[tuple[tuple[int, int], int], float] | None
+            ((エピソード番号, ページ番号), ダイヤ取得数) をキーとする変更後のクリア時間
+        move_times : dict[tuple[tuple[int, int], tuple[int, int]], float] | None
+            (移動元の (エピソード番号, ページ番号), 移動先の (エピソード番号, ページ番号)) をキーとする変更後の移動時間
+        """
+        level_times_new: np.ndarray = self.level_times.copy()
+        move_times_new: np.ndarray = self.move_times.copy()
+        level_id_changed: int = self.num_levels
+        for (ep_pg, num_gems), time in (level_times or {}).items():
+            level_id: int = self.get_level_id(ep_pg)
+            assert self.level_times[level_id, num_gems] != np.inf, (
+                f'{ep_pg} でダイヤ取得数 {num_gems} のクリア時間はありません'
+            )
+            level_times_new[level_id, num_gems] = time
+            level_id_changed = min(level_id_changed, level_id)
+        for (ep_pg_from, ep_pg_to), time in (move_times or {}).items():
+            level_id = self.get_level_id(ep_pg_from)
+            level_next_id: int = self.get_level_id(ep_pg_to)
+            # without_unusable_moves() で取り除いた移動(元の Level オブジェクトにはある)の移動時間は、チャートに影響しない
+            if (
+                    self.__find_move_id(level_id, level_next_id) < 0 and
+                    self.levels[level_next_id] in self.levels[level_id].get_next_levels_and_times().keys()):
+                continue
+            move_times_new[self.get_move_id(level_id, level_next_id)] = time
+            # 移動時間の変更は移動先の面から影響を受ける
+            level_id_changed = min(level_id_changed, level_next_id)
+        level_times_new.setflags(write=False)
+        move_times_new.setflags(write=False)
+        return (
+            dataclasses.replace(
+                self, level_times=level_times_new, move_times=move_times_new,
+            ),
+            level_id_changed,
+        )
+
+    @functools.cached_property
+    def costs_to_go(self) -> np.ndarray:
+        """
+        compute_costs_to_go() の結果(初めて使うときに求めて保持する)
+        ( with_times(), with_time_scale() で作ったインスタンスは求め直す)
+        """
+        costs_to_go: np.ndarray = self.compute_costs_to_go()
+        costs_to_go.setflags(write=False)
+        return costs_to_go
+
+    def compute_costs_to_go(self) -> np.ndarray:
+        """
+        逆向きの動的計画法により、各頂点 (面の番号, ダイヤ数) から (最終面, 最大必要ダイヤ数) までの最短の残り時間を求める
+        (形状は (面数, 最大必要ダイヤ数 + 1) で、最終面まで到達できない頂点は inf )
+        """
+        num_rows: int = self.max_required_gems + 1
+        gems_and_times: list[list[tuple[int, float]]] = self.get_gems_and_times()
+        move_times: list[float] = self.__scale(self.move_times).tolist()
+        # 整数に変換した時間の和も float で正確に表せる範囲に収まる
+        costs_to_go: np.ndarray = np.full((self.num_levels, num_rows), np.inf)
+        costs_to_go[-1, -1] = 0.0
+        for level_id in range(self.num_levels - 2, -1, -1):
+            costs: np.ndarray = costs_to_go[level_id]
+            for e in range(int(self.move_offsets[level_id]), int(self.move_offsets[level_id + 1])):
+                level_next_id: int = int(self.move_targets[e])
+                time_move: float = move_times[e]
+                row_from_min: int = max(int(self.move_required_gems[e]), 0)
+                for num_gems_next, time_next in gems_and_times[level_next_id]:
+                    row_from_max: int = num_rows - num_gems_next
+                    if row_from_min >= row_from_max:
+                        continue
+                    np.minimum(
+                        costs[row_from_min:row_from_max],
+                        time_move + time_next + costs_to_go[
+                            level_next_id, row_from_min + num_gems_next:
+                        ],
+                        out=costs[row_from_min:row_from_max],
+                    )
+        return costs_to_go
+
+    def get_gems_and_times(self) -> list[list[tuple[int, float]]]:
+        """各面について、取得するダイヤ数とクリアにかかる時間の組のリストを取得する"""
+        return [
+            [
+                (n, t if self.time_scale is None else int(t))
+                for n, t in enumerate(ts) if t != np.inf
+            ]
+            for ts in self.__scale(self.level_times).tolist()
+        ]
+
+    def __scale(self, times: np.ndarray) -> np.ndarray:
+        """時間の配列を 1 / time_scale 秒単位に変換する(整数値の float の配列で、 inf はそのまま)"""
+        if self.time_scale is None:
+            return times
+        return np.round(times * self.time_scale)
+
+    def __get_move_times(self) -> list[float]:
+        """各移動の移動時間を動的計画法で使う単位(秒の float か 1 / time_scale 秒の int )のリストで取得する"""
+        if self.time_scale is None:
+            return self.move_times.tolist()
+        return self.__scale(self.move_times).astype(np.int64).tolist()
+
+    def get_moves(self) -> list[list[tuple[int, float, int]]]:
+        """各面について、(移動先の面の番号, 移動時間, 移動先の面の必要ダイヤ数) のリストを取得する"""
+        offsets: list[int] = self.move_offsets.tolist()
+        targets: list[int] = self.move_targets.tolist()
+        times: list[float] = self.__get_move_times()
+        required_gems: list[int] = self.move_required_gems.tolist()
+        return [
+            [
+                (targets[e], times[e], required_gems[e])
+                for e in range(offsets[i], offsets[i + 1])
+            ]
+            for i in range(self.num_levels)
+        ]
+
+    def get_moves_in(self) -> list[list[tuple[int, float]]]:
+        """各面について、(移動元の面の番号, 移動時間) のリスト(手前の移動元から順)を取得する"""
+        sources: np.ndarray = np.repeat(
+            np.arange(self.num_levels), np.diff(self.move_offsets),
+        )
+        offsets: list[int] = self.moves_in_offsets.tolist()
+        ids: list[int] = self.moves_in_ids.tolist()
+        sources_list: list[int] = sources.tolist()
+        times: list[float] = self.__get_move_times()
+        return [
+            [
+                (sources_list[ids[p]], times[ids[p]])
+                for p in range(offsets[j], offsets[j + 1])
+            ]
+            for j in range(self.num_levels)
+        ]
+
+    def __repr__(self) -> str:
+        return (
+            f'#l={self.num_levels}, ' +
+            f'#m={len(self.move_targets)}, ' +
+            f'mrg={self.max_required_gems}'
+        )
+# ----------------------------------------------------------------------
+# -----------------------------------------------------------------------------
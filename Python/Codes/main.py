@@ -1,52 +1,157 @@
-# Project
-# -----------------------------------------------------------------------------
-# Title   : Dynamic Programming for Optimal Speedrun Strategy Exploration
-# Author  : [Twitter] @samuelladoco  [Twitch] SLDCtwitch
-# Contents: Main
-# -----------------------------------------------------------------------------
-
-
-# Import
-# -----------------------------------------------------------------------------
-from __future__ import annotations
-#
-from algorithm import OptimizerByDynamicProgramming, Vertex
-from level import Level
-from rw import Reader, Writer
-# -----------------------------------------------------------------------------
-
-
-# Settings
-# -----------------------------------------------------------------------------
-# Instance name
-instance_name: str = 'CTTT'
-# Mode: output of primal keys of 'Moves' file or run of algorithm
-output_moves_pks_only: bool = False
-# -----------------------------------------------------------------------------
-
-
-# Parameters
-# -----------------------------------------------------------------------------
-# Number of strategies (1st, ..., num_strategies-th (at maximum))
-num_strategies: int = 11
-# -----------------------------------------------------------------------------
-
-
-# -----------------------------------------------------------------------------
-levels: dict[tuple[int, int], Level]
-#
-# Output of primal keys of 'Moves' file
-if output_moves_pks_only:
-    levels = Reader.read_levels_only(instance_name)
-    Writer.output_moves_pks(instance_name, levels)
-# Run of algorithm
-else:
-    levels = Reader.read_levels_and_moves(instance_name)
-    opt_by_dp: OptimizerByDynamicProgramming = OptimizerByDynamicProgramming(
-        [l for l in levels.values()],
-        num_strategies,
-        max(l.num_required_gems for l in levels.values()),
-    )
-    strategies: list[tuple[list[Vertex], float]] = opt_by_dp.solve()
-    Writer.output_strategies(instance_name, strategies)
-# -----------------------------------------------------------------------------
+# Project
+# -----------------------------------------------------------------------------
+# Title   : Dynamic Programming for Optimal Speedrun Strategy Exploration
+# Author  : [Twitter] @samuelladoco  [Twitch] SLDCtwitch
+# Contents: Main
+# -----------------------------------------------------------------------------
+
+
+# Import
+# -----------------------------------------------------------------------------
+from __future__ import annotations
+import cProfile
+import itertools
+import operator
+import pathlib
+from typing import Iterable
+#
+from algorithm import OptimizerByDynamicProgramming, Vertex
+from algorithm_array import OptimizerByDynamicProgrammingWithArrays
+from cache import SolutionCache
+from evaluation import MonteCarloEvaluator, StrategyEvaluation
+from instance import CompiledInstance
+from level import Level
+from rw import Csv, Reader, Writer, workspace_base_folder
+# -----------------------------------------------------------------------------
+
+
+# Settings
+# -----------------------------------------------------------------------------
+# Instance name
+instance_name: str = 'CTTT'
+# Mode: output of primal keys of 'Moves' file or run of algorithm
+output_moves_pks_only: bool = False
+# Removal of moves that no strategy can use because of required gems (from output of primal keys and before run of algorithm)
+remove_unusable_moves: bool = True
+# Engine of algorithm: 'heap' (labels in heaps) or 'array' (labels in NumPy arrays)
+engine: str = 'heap'
+# Enumeration of strategies one by one on demand (only for 'heap' engine)
+enumerate_lazily: bool = False
+# Pruning of labels by lower bounds of remaining times (only for 'heap' engine)
+prune_by_lower_bounds: bool = False
+# Route-distinct strategies: labels deduplicated by sequence of levels, best gems kept per route (only for 'heap' engine)
+distinct_routes: bool = False
+# Memory-bounded mode: labels dropped after relaxation, back-pointers kept in compact arena (only for 'heap' engine)
+# (memory usage of labels written to Stats_<instance_name>.json)
+bound_memory: bool = False
+# File to which the arena is spilled in memory-bounded mode (None: kept in memory)
+spill_path: str | None = None
+# Collection of statistics of labels and timings (Stats_<instance_name>.json) (only for 'heap' engine)
+collect_stats: bool = False
+# Profiling of relaxation of labels with cProfile (Profile_<instance_name>.prof) (only for 'heap' engine)
+profile: bool = False
+# Unit of times in algorithm: None (float seconds) or integer scale (e.g. 100 for centiseconds)
+time_scale: int | None = None
+# Number of threads for independent merges of levels and gem rows (only for 'array' engine)
+num_workers: int = 1
+# Reuse of compiled input file (.npz) next to 'Levels' and 'Moves' files (rebuilt when they change)
+use_compiled_input: bool = True
+# Library for reading and writing of CSV files: 'csv' (standard library) or 'pandas'
+csv_backend: str = 'csv'
+# Reuse of strategies solved before with same 'Levels' and 'Moves' files and settings (only for 'solve')
+use_solution_cache: bool = False
+# Re-planning from level cleared last: None (from first level) or ((episode, page), cumulative gems) (only for 'heap' engine)
+start_vertex: tuple[tuple[int, int], int] | None = None
+# Elapsed seconds when level of start_vertex is cleared
+elapsed_time: float = 0.0
+# Monte Carlo evaluation of strategies under variance of clear times (Evaluations_<instance_name>.csv)
+# ('Std_NumGems-<n>' columns at end of 'Levels' file and/or 'Samples' file (Episode, Page, NumGems, Time))
+evaluate_strategies: bool = False
+# Number of simulated runs of each strategy in evaluation
+num_simulated_runs: int = 1_000_000
+# Target time in seconds for probability of beating it in evaluation (None: not evaluated)
+target_time: float | None = None
+# Output of each strategy as difference from previous one (Solutions_<instance_name>_compact.csv)
+output_compact: bool = False
+# -----------------------------------------------------------------------------
+
+
+# Parameters
+# -----------------------------------------------------------------------------
+# Number of strategies (1st, ..., num_strategies-th (at maximum))
+num_strategies: int = 11
+# -----------------------------------------------------------------------------
+
+
+# -----------------------------------------------------------------------------
+Csv.backend = csv_backend
+levels: dict[tuple[int, int], Level]
+#
+# Output of primal keys of 'Moves' file
+if output_moves_pks_only:
+    levels = Reader.read_levels_only(instance_name)
+    Writer.output_moves_pks(instance_name, levels, remove_unusable_moves)
+# Run of algorithm
+else:
+    levels = (
+        Reader.read_levels_and_moves_compiled(instance_name) if use_compiled_input else
+        Reader.read_levels_and_moves(instance_name)
+    )
+    instance: CompiledInstance = CompiledInstance.from_levels(
+        [l for l in levels.values()], time_scale,
+    )
+    if remove_unusable_moves:
+        instance = instance.without_unusable_moves()
+    opt_by_dp: OptimizerByDynamicProgramming | OptimizerByDynamicProgrammingWithArrays
+    if engine == 'array':
+        opt_by_dp = OptimizerByDynamicProgrammingWithArrays(
+            instance, num_strategies, num_workers,
+        )
+    else:
+        opt_by_dp = OptimizerByDynamicProgramming(
+            instance, num_strategies, prune_by_lower_bounds, bound_memory,
+            None if spill_path is None else pathlib.Path(spill_path),
+            collect_stats, cProfile.Profile() if profile else None,
+            operator.attrgetter('ep_pg') if distinct_routes else None,
+        )
+    # (逐次列挙の場合、チャートは求まった順に1個ずつ書き込まれる)
+    strategies: Iterable[tuple[list[Vertex], float]]
+    # (途中の頂点から求めるのは 'heap' エンジンの場合のみ)
+    solved_from_start_vertex: bool = (
+        start_vertex is not None and isinstance(opt_by_dp, OptimizerByDynamicProgramming)
+    )
+    if start_vertex is not None and isinstance(opt_by_dp, OptimizerByDynamicProgramming):
+        strategies = opt_by_dp.solve_from(
+            Vertex(levels[start_vertex[0]], start_vertex[1]),
+            elapsed_time if time_scale is None else round(elapsed_time * time_scale),
+        )
+    elif enumerate_lazily and isinstance(opt_by_dp, OptimizerByDynamicProgramming):
+        strategies = itertools.islice(
+            opt_by_dp.iter_strategies(), num_strategies,
+        )
+    elif use_solution_cache:
+        strategies = SolutionCache().solve(Reader.get_digest(instance_name), opt_by_dp)
+    else:
+        strategies = opt_by_dp.solve()
+    # (評価する場合は、チャートを全て保持する)
+    if evaluate_strategies:
+        strategies = [s for s in strategies]
+    Writer.output_strategies(instance_name, strategies, time_scale, output_compact)
+    if evaluate_strategies:
+        evaluations: list[StrategyEvaluation] = MonteCarloEvaluator(
+            Reader.read_split_time_distributions(instance_name),
+            num_simulated_runs, target_time=target_time,
+        ).evaluate(strategies, time_scale, solved_from_start_vertex)
+        Writer.output_evaluations(instance_name, strategies, evaluations, time_scale)
+    if isinstance(opt_by_dp, OptimizerByDynamicProgramming):
+        # (省メモリモードでは、ラベルのメモリ使用量も統計とともに出力する)
+        if collect_stats or bound_memory:
+            Writer.output_stats(
+                instance_name, opt_by_dp.get_stats(),
+                opt_by_dp.get_memory_usage() if bound_memory else None,
+            )
+        if opt_by_dp.profiler is not None:
+            opt_by_dp.profiler.dump_stats(
+                workspace_base_folder / 'Output' / f'Profile_{instance_name}.prof'
+            )
+# -----------------------------------------------------------------------------
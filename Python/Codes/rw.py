@@ -1,202 +1,611 @@
-# Project
-# -----------------------------------------------------------------------------
-# Title   : Dynamic Programming for Optimal Speedrun Strategy Exploration
-# Author  : [Twitter] @samuelladoco  [Twitch] SLDCtwitch
-# Contents: Reading and writing of files
-# -----------------------------------------------------------------------------
-
-
-# Import
-# -----------------------------------------------------------------------------
-from __future__ import annotations
-import os
-import pandas as pd
-import pathlib
-import queue
-from typing import Any
-#
-from algorithm import Vertex
-from level import Level
-# -----------------------------------------------------------------------------
-
-
-# Workspace base folder
-# -----------------------------------------------------------------------------
-workspace_base_folder: pathlib.Path = (
-    pathlib.Path(rf'{os.path.dirname(__file__)}').parents[1]
-)
-# -----------------------------------------------------------------------------
-
-
-# Classes
-# -----------------------------------------------------------------------------
-# ----------------------------------------------------------------------
-class Reader:
-    """インスタンスのファイルの読み込み(クラスメソッドのみ)"""
-
-    @classmethod
-    def read_levels_only(cls,
-            instance_name: str,
-            ) -> dict[tuple[int, int], Level]:
-        """
-        Levels ファイルを読み込み、(手前の面から並んだ) Level オブジェクトの集合を生成して返す
-        ( ただし next_levels_and_times は設定されていない )
-        """
-
-        df_ins_levels: pd.DataFrame = pd.read_csv(
-            workspace_base_folder / 'Input' / instance_name / 'Levels.csv'
-        )
-
-        max_gems_per_l: int = max(
-            int(str(c).strip('Time_NumGems-')) for c in df_ins_levels.columns
-            if (str(c).strip('Time_NumGems-')).isdigit() is True
-        )
-        #
-        temp_ep: int = max(
-            int(str(c).strip('Unlock_Ep-')) for c in df_ins_levels.columns
-            if (str(c).strip('Unlock_Ep-')).isdigit() is True
-        )
-        temp_pg: int = max(
-            int(str(c).strip('Unlock_Pg-')) for c in df_ins_levels.columns
-            if (str(c).strip('Unlock_Pg-')).isdigit() is True
-        )
-        assert temp_ep == temp_pg, (
-            f'Unlock_Ep- の最大数 {temp_ep} != Unlock_Pg- の最大数 {temp_pg} です'
-        )
-        max_unlock_ls_per_l: int = temp_ep
-
-        # Set of levels
-        levels: dict[tuple[int, int], Level] = {}
-        # そんなに行数もないので itertuples() で回してもいいか
-        for row in df_ins_levels.itertuples():
-            l_from: Level = Level(
-                (int(row[1]), int(row[2])),
-                str(row[3]),
-                cls.__to_zero_if_nan_else_cast(row[4]),
-                {
-                    i - 5: round(float(row[i]), 2)
-                    for i in range(5, 5 + max_gems_per_l + 1)
-                },
-            )
-            levels[l_from.ep_pg] = l_from
-        #
-        # そんなに行数もないので itertuples() で回してもいいか
-        for row in df_ins_levels.itertuples():
-            for j in range(
-                    5 + max_gems_per_l + 1,
-                    5 + max_gems_per_l + 1 + 2 * max_unlock_ls_per_l,
-                    2):
-                episode_to: int = cls.__to_zero_if_nan_else_cast(row[j])
-                page_to: int = cls.__to_zero_if_nan_else_cast(row[j + 1])
-                if episode_to != 0 and page_to != 0:
-                    levels[int(row[1]), int(row[2])].add_to_be_unlock_levels(
-                        levels[episode_to, page_to]
-                    )
-
-        return {l.ep_pg: l for l in [ll for ll in sorted(levels.values())]}
-
-    @classmethod
-    def read_levels_and_moves(cls,
-            instance_name: str,
-            ) -> dict[tuple[int, int], Level]:
-        """
-        Levels, Moves ファイルを読み込み、(手前の面から並んだ) Level オブジェクトの集合を生成して返す
-        ( next_levels_and_times も設定される )
-        """
-        levels: dict[tuple[int, int], Level] = Reader.read_levels_only(instance_name)
-
-        df_ins_moves: pd.DataFrame = pd.read_csv(
-            workspace_base_folder / 'Input' / instance_name / 'Moves.csv'
-        )
-
-        for row in df_ins_moves.itertuples():
-            l_from: Level = levels[int(row[1]), int(row[2])]
-            l_to: Level = levels[int(row[3]), int(row[4])]
-            l_from.add_next_levels_and_times(l_to, float(row[5]))
-
-        return levels
-
-    @classmethod
-    def __to_zero_if_nan_else_cast(cls, e: Any) -> int:
-        """e が nan ならば 0 に変換し、そうでなければ int型 にキャストする"""
-        return 0 if pd.isna(e) is True else int(e)
-# ----------------------------------------------------------------------
-
-# ----------------------------------------------------------------------
-class Writer:
-    """処理結果のファイルへの書き込み(クラスメソッドのみ)"""
-
-    @classmethod
-    def output_moves_pks(cls,
-            instance_name: str,
-            levels: dict[tuple[int, int], Level],
-            ) -> None:
-        """level オブジェクト の to_be_unlock_level の情報を元に、 Moves ファイルの主キー部分を出力する"""
-        moves_pks: list[tuple[Level, Level]] = []
-        #
-        ls_unlocked_q: queue.PriorityQueue[Level] = queue.PriorityQueue()
-        ls_unlocked_set: set[Level] = set()
-        l_first: Level = [l for l in levels.values()][0]
-        ls_unlocked_q.put(l_first)
-        ls_unlocked_set.add(l_first)
-        #
-        while ls_unlocked_q.empty() is False:
-            l_from: Level = ls_unlocked_q.get()
-            ls_unlocked_set.remove(l_from)
-            #
-            for l_to_be_unlocked in l_from.get_to_be_unlock_levels():
-                ls_unlocked_q.put(l_to_be_unlocked)
-                ls_unlocked_set.add(l_to_be_unlocked)
-            #
-            for l_to in ls_unlocked_set:
-                moves_pks.append((l_from, l_to))
-        #
-        moves_pks.sort()
-        #
-        rows: list[list[Any]] = []
-        cols: list[str] = ['Ep-From', 'Pg-From', 'Ep-To', 'Pg-To', 'Time']
-        for pk in moves_pks:
-            rows.append(
-                [pk[0].ep_pg[0], pk[0].ep_pg[1], pk[1].ep_pg[0], pk[1].ep_pg[1], ''],
-            )
-        df_moves_pks: pd.DataFrame = pd.DataFrame(data=rows, columns=cols, )
-        df_moves_pks.to_csv(
-            workspace_base_folder / 'Output' / f'Moves_base_{instance_name}.csv',
-            index=False,
-        )
-
-    @classmethod
-    def output_strategies(cls,
-            instance_name: str,
-            strategies: list[tuple[list[Vertex], float]],
-            ) -> None:
-        """ チャートとして strategies (複数個の場合あり)を出力する"""
-
-        rows: list[list[Any]] = []
-        cols: list[str] = [
-            'Rank', 'TimeDifference', 'Time', 'Strategy(Level(NumCumGems))'
-        ]
-        time_prev: float = strategies[0][1]
-        rank: int = 1
-        for index, strategy in enumerate(strategies):
-            time_diff: float = strategy[1] - time_prev
-            #
-            level_num_cum_gems: str = ' -> '.join([
-                f'{v.level.ep_pg[0]}-{v.level.ep_pg[1]:0>2}({v.cumlative_num_gems:0>3})'
-                for v in strategy[0]
-            ])
-            #
-            if time_diff > 0.0009:
-                rank = index + 1
-            rows.append(
-                [rank, f'{time_diff:.2f}', f'{strategy[1]:.2f}', level_num_cum_gems],
-            )
-            time_prev = strategy[1]
-
-        df_sols: pd.DataFrame = pd.DataFrame(data=rows, columns=cols, )
-        df_sols.to_csv(
-            workspace_base_folder / 'Output' / f'Solutions_{instance_name}.csv',
-            index=False,
-        )
-# ----------------------------------------------------------------------
-# -----------------------------------------------------------------------------
+# Project
+# -----------------------------------------------------------------------------
+# Title   : Dynamic Programming for Optimal Speedrun Strategy Exploration
+# Author  : [Twitter] @samuelladoco  [Twitch] SLDCtwitch
+# Contents: Reading and writing of files
+# -----------------------------------------------------------------------------
+
+
+# Import
+# -----------------------------------------------------------------------------
+from __future__ import annotations
+import bisect
+import csv
+import decimal
+import hashlib
+import importlib
+import json
+import numpy as np
+import os
+import pathlib
+from typing import Any, ClassVar, Iterable, Iterator
+#
+from algorithm import SolverStats, Vertex
+from evaluation import SplitTimeDistributions, StrategyEvaluation
+from instance import CompiledInstance
+from level import Level
+# -----------------------------------------------------------------------------
+
+
+# Workspace base folder
+# -----------------------------------------------------------------------------
+workspace_base_folder: pathlib.Path = (
+    pathlib.Path(rf'{os.path.dirname(__file__)}').parents[1]
+)
+# -----------------------------------------------------------------------------
+
+
+# Classes
+# -----------------------------------------------------------------------------
+# ----------------------------------------------------------------------
+class Csv:
+    """
+    CSV ファイルの読み書き(クラスメソッドのみ)
+
+    backend が 'csv' (既定)の場合は標準ライブラリの csv モジュールを使い、
+    'pandas' の場合に限り pandas を(初めて使うときに)インポートして使う。
+    どちらの場合も読み込んだ行は DataFrame.itertuples() と同じく先頭が行番号のタプルで、
+    空欄は nan 、数値は int か float になる
+    """
+
+    # 'csv' (標準ライブラリ) か 'pandas'
+    backend: ClassVar[str] = 'csv'
+
+    @classmethod
+    def read(cls, path: pathlib.Path) -> tuple[list[str], list[tuple[Any, ...]]]:
+        """path を読み込み、列名のリストと行のリストを返す"""
+        if cls.backend == 'pandas':
+            df: Any = importlib.import_module('pandas').read_csv(path)
+            return [str(c) for c in df.columns], [row for row in df.itertuples()]
+        #
+        with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+            lines: list[list[str]] = [line for line in csv.reader(f) if len(line) > 0]
+        cols: list[str] = lines[0]
+        rows: list[tuple[Any, ...]] = []
+        for index, line in enumerate(lines[1:]):
+            # 列数に足りない分は空欄とする
+            line += [''] * (len(cols) - len(line))
+            rows.append((index, *(cls.__parse(e) for e in line)))
+        return cols, rows
+
+    @classmethod
+    def write(cls,
+            path: pathlib.Path,
+            cols: list[str],
+            rows: Iterable[list[Any]],
+            ) -> None:
+        """
+        列名が cols で、行が rows の CSV ファイルを path に書き込む(行番号の列はなし)
+
+        backend が 'csv' の場合、 rows は1行ずつ取り出しながら書き込む(全ての行をメモリに保持しない)
+        """
+        if cls.backend == 'pandas':
+            importlib.import_module('pandas').DataFrame(
+                data=list(rows), columns=cols,
+            ).to_csv(path, index=False, )
+            return
+        # DataFrame.to_csv() と同じく、改行文字は os.linesep とする
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, lineterminator=os.linesep)
+            writer.writerow(cols)
+            writer.writerows(rows)
+
+    @classmethod
+    def iter_lines(cls, path: pathlib.Path) -> Iterator[list[str]]:
+        """path を1行ずつ(列名の行を含めて、変換せずに文字列のリストとして)読み込む"""
+        with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+            for line in csv.reader(f):
+                if len(line) > 0:
+                    yield line
+
+    @classmethod
+    def is_na(cls, e: Any) -> bool:
+        """e が空欄(nan)か"""
+        return isinstance(e, float) and e != e
+
+    @classmethod
+    def __parse(cls, e: str) -> Any:
+        """セルの文字列を int 、 float 、文字列のいずれかに変換する(空欄は nan )"""
+        if e == '':
+            return float('nan')
+        try:
+            return int(e)
+        except ValueError:
+            pass
+        try:
+            return float(e)
+        except ValueError:
+            return e
+# ----------------------------------------------------------------------
+
+# ----------------------------------------------------------------------
+class Reader:
+    """インスタンスのファイルの読み込み(クラスメソッドのみ)"""
+
+    @classmethod
+    def read_levels_only(cls,
+            instance_name: str,
+            levels_file_name: str = 'Levels.csv',
+            ) -> dict[tuple[int, int], Level]:
+        """
+        Levels ファイルを読み込み、(手前の面から並んだ) Level オブジェクトの集合を生成して返す
+        ( ただし next_levels_and_times は設定されていない )
+        """
+
+        cols_ins_levels, rows_ins_levels = Csv.read(
+            workspace_base_folder / 'Input' / instance_name / levels_file_name
+        )
+
+        max_gems_per_l: int = max(
+            int(str(c).strip('Time_NumGems-')) for c in cols_ins_levels
+            if (str(c).strip('Time_NumGems-')).isdigit() is True
+        )
+        #
+        temp_ep: int = max(
+            int(str(c).strip('Unlock_Ep-')) for c in cols_ins_levels
+            if (str(c).strip('Unlock_Ep-')).isdigit() is True
+        )
+        temp_pg: int = max(
+            int(str(c).strip('Unlock_Pg-')) for c in cols_ins_levels
+            if (str(c).strip('Unlock_Pg-')).isdigit() is True
+        )
+        assert temp_ep == temp_pg, (
+            f'Unlock_Ep- の最大数 {temp_ep} != Unlock_Pg- の最大数 {temp_pg} です'
+        )
+        max_unlock_ls_per_l: int = temp_ep
+
+        # Set of levels
+        levels: dict[tuple[int, int], Level] = {}
+        # そんなに行数もないので itertuples() で回してもいいか
+        for row in rows_ins_levels:
+            l_from: Level = Level(
+                (int(row[1]), int(row[2])),
+                str(row[3]),
+                cls.__to_zero_if_nan_else_cast(row[4]),
+                {
+                    i - 5: round(float(row[i]), 2)
+                    for i in range(5, 5 + max_gems_per_l + 1)
+                },
+            )
+            levels[l_from.ep_pg] = l_from
+        #
+        # そんなに行数もないので itertuples() で回してもいいか
+        for row in rows_ins_levels:
+            for j in range(
+                    5 + max_gems_per_l + 1,
+                    5 + max_gems_per_l + 1 + 2 * max_unlock_ls_per_l,
+                    2):
+                episode_to: int = cls.__to_zero_if_nan_else_cast(row[j])
+                page_to: int = cls.__to_zero_if_nan_else_cast(row[j + 1])
+                if episode_to != 0 and page_to != 0:
+                    levels[int(row[1]), int(row[2])].add_to_be_unlock_levels(
+                        levels[episode_to, page_to]
+                    )
+
+        return {l.ep_pg: l for l in [ll for ll in sorted(levels.values())]}
+
+    @classmethod
+    def read_levels_and_moves(cls,
+            instance_name: str,
+            levels_file_name: str = 'Levels.csv',
+            moves_file_name: str = 'Moves.csv',
+            ) -> dict[tuple[int, int], Level]:
+        """
+        Levels, Moves ファイルを読み込み、(手前の面から並んだ) Level オブジェクトの集合を生成して返す
+        ( next_levels_and_times も設定される )
+        """
+        levels: dict[tuple[int, int], Level] = Reader.read_levels_only(
+            instance_name, levels_file_name,
+        )
+
+        _, rows_ins_moves = Csv.read(
+            workspace_base_folder / 'Input' / instance_name / moves_file_name
+        )
+
+        for row in rows_ins_moves:
+            l_from: Level = levels[int(row[1]), int(row[2])]
+            l_to: Level = levels[int(row[3]), int(row[4])]
+            l_from.add_next_levels_and_times(l_to, float(row[5]))
+
+        return levels
+
+    @classmethod
+    def read_levels_and_moves_compiled(cls,
+            instance_name: str,
+            levels_file_name: str = 'Levels.csv',
+            moves_file_name: str = 'Moves.csv',
+            ) -> dict[tuple[int, int], Level]:
+        """
+        read_levels_and_moves と同じ Level オブジェクトの集合を返すが、
+        CSV ファイルと同じフォルダのコンパイル済みファイル( .npz )があればそちらから読み込む
+
+        コンパイル済みファイルには Levels, Moves ファイルの内容のハッシュ値を保存しておき、
+        CSV ファイルが変更された場合(ハッシュ値が一致しない場合)は CSV ファイルを読み込んで作り直す
+        """
+        folder: pathlib.Path = workspace_base_folder / 'Input' / instance_name
+        digest: str = cls.get_digest(instance_name, levels_file_name, moves_file_name)
+        compiled_path: pathlib.Path = folder / (
+            f'Compiled_{pathlib.Path(levels_file_name).stem}_' +
+            f'{pathlib.Path(moves_file_name).stem}.npz'
+        )
+        #
+        if compiled_path.exists() is True:
+            with np.load(compiled_path) as npz:
+                if str(npz['digest']) == digest:
+                    return cls.__levels_from_arrays(npz)
+        #
+        levels: dict[tuple[int, int], Level] = Reader.read_levels_and_moves(
+            instance_name, levels_file_name, moves_file_name,
+        )
+        # 複数のプロセスが同時に作り直しても壊れたファイルが読まれないように、一時ファイルから置き換える
+        temp_path: pathlib.Path = compiled_path.with_name(
+            f'{compiled_path.name}.{os.getpid()}.tmp'
+        )
+        arrays: dict[str, Any] = {'digest': np.array(digest)}
+        arrays.update(cls.__levels_to_arrays(levels))
+        with open(temp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temp_path, compiled_path)
+        return levels
+
+    @classmethod
+    def read_split_time_distributions(cls,
+            instance_name: str,
+            levels_file_name: str = 'Levels.csv',
+            samples_file_name: str = 'Samples.csv',
+            ) -> SplitTimeDistributions:
+        """
+        クリア時間のばらつきを読み込む
+
+        Levels ファイルの Std_NumGems-<ダイヤ取得数> の列(任意で、 Unlock_ の列より後ろに置く)を標準偏差とし、
+        Samples ファイル(任意で、列は Episode, Page, NumGems, Time で1行が1回の実測値)を実測値とする
+        """
+        folder: pathlib.Path = workspace_base_folder / 'Input' / instance_name
+        cols_ins_levels, rows_ins_levels = Csv.read(folder / levels_file_name)
+        # 行の先頭は行番号なので、列の位置は 1 つずれる
+        std_cols: dict[int, int] = {
+            int(str(c)[len('Std_NumGems-'):]): j + 1 for j, c in enumerate(cols_ins_levels)
+            if str(c).startswith('Std_NumGems-') and str(c)[len('Std_NumGems-'):].isdigit() is True
+        }
+        stds: dict[tuple[tuple[int, int], int], float] = {
+            ((int(row[1]), int(row[2])), num_gems): float(row[j])
+            for row in rows_ins_levels for num_gems, j in std_cols.items()
+            if Csv.is_na(row[j]) is False
+        }
+        #
+        samples: dict[tuple[tuple[int, int], int], list[float]] = {}
+        if (folder / samples_file_name).exists() is True:
+            _, rows_ins_samples = Csv.read(folder / samples_file_name)
+            for row in rows_ins_samples:
+                samples.setdefault(
+                    ((int(row[1]), int(row[2])), int(row[3])), []
+                ).append(float(row[4]))
+        return SplitTimeDistributions(stds, samples)
+
+    @classmethod
+    def read_strategies_compact(cls,
+            instance_name: str,
+            ) -> Iterator[list[str]]:
+        """
+        Writer.output_strategies(compact=True) で出力した Solutions_<instance_name>_compact.csv を1行ずつ読み込み、
+        Solutions_<instance_name>.csv と同じ列( Rank, TimeDifference, Time, Strategy(Level(NumCumGems)) )の行に展開して返す
+        """
+        lines: Iterator[list[str]] = Csv.iter_lines(
+            workspace_base_folder / 'Output' / f'Solutions_{instance_name}_compact.csv'
+        )
+        assert next(lines) == Writer.cols_strategies_compact, (
+            f'Solutions_{instance_name}_compact.csv の列名が正しくありません'
+        )
+        tokens_prev: list[str] = []
+        for rank, time_diff, time, prefix_length, suffix in lines:
+            tokens: list[str] = tokens_prev[:int(prefix_length)] + (
+                suffix.split(' -> ') if suffix != '' else []
+            )
+            yield [rank, time_diff, time, ' -> '.join(tokens)]
+            tokens_prev = tokens
+
+    @classmethod
+    def get_digest(cls,
+            instance_name: str,
+            levels_file_name: str = 'Levels.csv',
+            moves_file_name: str = 'Moves.csv',
+            ) -> str:
+        """Levels, Moves ファイルの内容のハッシュ値を取得する"""
+        folder: pathlib.Path = workspace_base_folder / 'Input' / instance_name
+        h = hashlib.sha256()
+        for path in (folder / levels_file_name, folder / moves_file_name):
+            data: bytes = path.read_bytes()
+            h.update(len(data).to_bytes(8, 'little'))
+            h.update(data)
+        return h.hexdigest()
+
+    @classmethod
+    def __levels_to_arrays(cls,
+            levels: dict[tuple[int, int], Level],
+            ) -> dict[str, np.ndarray]:
+        """Level オブジェクトの集合を(面の番号で添字付けした)配列たちに変換する"""
+        ls: list[Level] = [l for l in levels.values()]
+        level_ids: dict[Level, int] = {l: i for i, l in enumerate(ls)}
+        max_gems_per_l: int = max(max(l.times.keys()) for l in ls)
+        #
+        times: np.ndarray = np.full((len(ls), max_gems_per_l + 1), np.nan)
+        for i, l in enumerate(ls):
+            for n, t in l.times.items():
+                times[i, n] = t
+        unlocks: list[tuple[int, int]] = [
+            (i, level_ids[l_to])
+            for i, l in enumerate(ls) for l_to in l.get_to_be_unlock_levels()
+        ]
+        moves: list[tuple[int, int, float]] = [
+            (i, level_ids[l_to], t)
+            for i, l in enumerate(ls) for l_to, t in l.get_next_levels_and_times().items()
+        ]
+        return {
+            'ep_pgs': np.array([l.ep_pg for l in ls], dtype=np.int64).reshape(-1, 2),
+            'names': np.array([l.name for l in ls], dtype=np.str_),
+            'num_required_gems': np.array([l.num_required_gems for l in ls], dtype=np.int64),
+            'times': times,
+            'unlocks': np.array(unlocks, dtype=np.int64).reshape(-1, 2),
+            'moves_level_ids': np.array([m[:2] for m in moves], dtype=np.int64).reshape(-1, 2),
+            'moves_times': np.array([m[2] for m in moves], dtype=np.float64),
+        }
+
+    @classmethod
+    def __levels_from_arrays(cls, arrays: Any) -> dict[tuple[int, int], Level]:
+        """配列たちから Level オブジェクトの集合を生成する( __levels_to_arrays の逆)"""
+        times: list[list[float]] = arrays['times'].tolist()
+        ls: list[Level] = [
+            Level(
+                (ep, pg), name, num_required_gems,
+                {n: t for n, t in enumerate(ts)},
+            )
+            for (ep, pg), name, num_required_gems, ts in zip(
+                arrays['ep_pgs'].tolist(), arrays['names'].tolist(),
+                arrays['num_required_gems'].tolist(), times,
+            )
+        ]
+        for i, j in arrays['unlocks'].tolist():
+            ls[i].add_to_be_unlock_levels(ls[j])
+        for (i, j), t in zip(
+                arrays['moves_level_ids'].tolist(), arrays['moves_times'].tolist()):
+            ls[i].add_next_levels_and_times(ls[j], t)
+        return {l.ep_pg: l for l in ls}
+
+    @classmethod
+    def __to_zero_if_nan_else_cast(cls, e: Any) -> int:
+        """e が nan ならば 0 に変換し、そうでなければ int型 にキャストする"""
+        return 0 if Csv.is_na(e) is True else int(e)
+# ----------------------------------------------------------------------
+
+# ----------------------------------------------------------------------
+class Writer:
+    """処理結果のファイルへの書き込み(クラスメソッドのみ)"""
+
+    # Solutions ファイルの列名
+    cols_strategies: ClassVar[list[str]] = [
+        'Rank', 'TimeDifference', 'Time', 'Strategy(Level(NumCumGems))'
+    ]
+    # 差分形式の Solutions ファイルの列名
+    cols_strategies_compact: ClassVar[list[str]] = [
+        'Rank', 'TimeDifference', 'Time', 'PrefixLength', 'Suffix(Level(NumCumGems))'
+    ]
+
+    @classmethod
+    def output_moves_pks(cls,
+            instance_name: str,
+            levels: dict[tuple[int, int], Level],
+            remove_unusable_moves: bool = False,
+            ) -> None:
+        """
+        level オブジェクト の to_be_unlock_level の情報を元に、 Moves ファイルの主キー部分を出力する
+
+        remove_unusable_moves が True の場合、必要ダイヤ数により最初の面から最終面までのいずれのチャートでも使われ得ない移動を除く
+        ( CompiledInstance.get_usable_moves() で判定する)
+        """
+        rows: list[list[Any]] = []
+        cols: list[str] = ['Ep-From', 'Pg-From', 'Ep-To', 'Pg-To', 'Time']
+        moves_pks: list[tuple[Level, Level]] = cls.get_moves_pks(levels)
+        if remove_unusable_moves:
+            instance: CompiledInstance = CompiledInstance.from_levels_and_moves_pks(
+                [l for l in levels.values()], moves_pks,
+            )
+            is_usable: list[bool] = instance.get_usable_moves().tolist()
+            usable: set[tuple[Level, Level]] = {
+                (instance.levels[i], instance.levels[int(instance.move_targets[e])])
+                for i in range(instance.num_levels)
+                for e in range(int(instance.move_offsets[i]), int(instance.move_offsets[i + 1]))
+                if is_usable[e]
+            }
+            moves_pks = [pk for pk in moves_pks if pk in usable]
+        for pk in moves_pks:
+            rows.append(
+                [pk[0].ep_pg[0], pk[0].ep_pg[1], pk[1].ep_pg[0], pk[1].ep_pg[1], ''],
+            )
+        Csv.write(
+            workspace_base_folder / 'Output' / f'Moves_base_{instance_name}.csv',
+            cols, rows,
+        )
+
+    @classmethod
+    def get_moves_pks(cls,
+            levels: dict[tuple[int, int], Level],
+            ) -> list[tuple[Level, Level]]:
+        """
+        level オブジェクト の to_be_unlock_level の情報を元に、 Moves ファイルの主キー ( 移動元の面, 移動先の面 ) のリストを求める
+
+        面を手前から順に1回だけたどり、開放済みの面については、その時点で開放されていてまだたどっていない全ての面への移動を主キーとする
+        (開放される面は開放する面より後ろにあり、各面を開放する面は1つだけとする)
+        """
+        moves_pks: list[tuple[Level, Level]] = []
+        #
+        ls_sorted: list[Level] = sorted(levels.values())
+        # 開放されていてまだたどっていない面(手前から順)
+        ls_unlocked: list[Level] = [ls_sorted[0]]
+        for l_from in ls_sorted:
+            # 開放されていない面
+            if len(ls_unlocked) == 0 or ls_unlocked[0] != l_from:
+                continue
+            del ls_unlocked[0]
+            #
+            for l_to_be_unlocked in l_from.get_to_be_unlock_levels():
+                assert l_from < l_to_be_unlocked, (
+                    f'{l_from.ep_pg} が手前の面 {l_to_be_unlocked.ep_pg} を開放します'
+                )
+                index: int = bisect.bisect_left(ls_unlocked, l_to_be_unlocked)
+                assert index == len(ls_unlocked) or ls_unlocked[index] != l_to_be_unlocked, (
+                    f'{l_to_be_unlocked.ep_pg} は複数の面から開放されます'
+                )
+                ls_unlocked.insert(index, l_to_be_unlocked)
+            #
+            moves_pks.extend((l_from, l_to) for l_to in ls_unlocked)
+        return moves_pks
+
+    @classmethod
+    def output_strategies(cls,
+            instance_name: str,
+            strategies: Iterable[tuple[list[Vertex], float]],
+            time_scale: int | None = None,
+            compact: bool = False,
+            ) -> None:
+        """
+        チャートとして strategies (複数個の場合あり)を出力する
+
+        strategies は1個ずつ取り出しながら書き込むので、 iter_strategies() などのジェネレーターをそのまま渡せる。
+        time_scale が None でない場合、 strategies の時間は 1 / time_scale 秒単位の整数であり、
+        順位と時間差を誤差なく計算する。
+        compact が True の場合、各チャートを1つ前のチャートとの差分(共通の先頭部分の面の個数と、残りの部分)として
+        Solutions_<instance_name>_compact.csv に出力する( Reader.read_strategies_compact() で元の形式に展開できる)
+        """
+        if compact is False:
+            Csv.write(
+                workspace_base_folder / 'Output' / f'Solutions_{instance_name}.csv',
+                cls.cols_strategies,
+                cls.get_strategy_rows(strategies, time_scale),
+            )
+        else:
+            Csv.write(
+                workspace_base_folder / 'Output' / f'Solutions_{instance_name}_compact.csv',
+                cls.cols_strategies_compact,
+                cls.__iter_compact_rows(cls.__iter_strategy_rows(strategies, time_scale)),
+            )
+
+    @classmethod
+    def get_strategy_rows(cls,
+            strategies: Iterable[tuple[list[Vertex], float]],
+            time_scale: int | None = None,
+            ) -> Iterator[list[Any]]:
+        """strategies を Solutions ファイルの行( cols_strategies の列)として1行ずつ返す"""
+        for rank, time_diff, time, tokens in cls.__iter_strategy_rows(strategies, time_scale):
+            yield [rank, time_diff, time, ' -> '.join(tokens)]
+
+    @classmethod
+    def output_evaluations(cls,
+            instance_name: str,
+            strategies: list[tuple[list[Vertex], float]],
+            evaluations: list[StrategyEvaluation],
+            time_scale: int | None = None,
+            ) -> None:
+        """チャートとその時間のシミュレーションの結果( MonteCarloEvaluator.evaluate() )を Evaluations_<instance_name>.csv に出力する"""
+        percentiles: list[float] = (
+            [p for p in evaluations[0].percentiles.keys()] if len(evaluations) > 0 else []
+        )
+        cols: list[str] = (
+            ['Rank', 'Time', 'Time_Mean', 'Time_Std'] +
+            [f'Time_Percentile-{p:g}' for p in percentiles] +
+            ['Probability_BeatTarget', 'Strategy(Level(NumCumGems))']
+        )
+        Csv.write(
+            workspace_base_folder / 'Output' / f'Evaluations_{instance_name}.csv',
+            cols,
+            (
+                [rank, time, f'{e.mean:.2f}', f'{e.std:.2f}'] +
+                [f'{e.percentiles[p]:.2f}' for p in percentiles] +
+                [
+                    '' if e.probability_of_beating_target is None else
+                    f'{e.probability_of_beating_target:.4f}',
+                    strategy,
+                ]
+                for (rank, _, time, strategy), e in zip(
+                    cls.get_strategy_rows(strategies, time_scale), evaluations,
+                )
+            ),
+        )
+
+    @classmethod
+    def output_stats(cls,
+            instance_name: str,
+            stats: SolverStats,
+            memory_usage: dict[str, int] | None = None,
+            ) -> None:
+        """
+        ラベルの探索の統計を Stats_<instance_name>.json に出力する
+        ( memory_usage が None でない場合は、 OptimizerByDynamicProgramming.get_memory_usage() の値を memory_usage として加える)
+        """
+        d: dict[str, Any] = stats.to_dict()
+        if memory_usage is not None:
+            d['memory_usage'] = memory_usage
+        with open(
+                workspace_base_folder / 'Output' / f'Stats_{instance_name}.json',
+                'w', encoding='utf-8') as f:
+            json.dump(d, f, indent=4)
+
+    @classmethod
+    def expand_strategies_compact(cls, instance_name: str) -> None:
+        """Solutions_<instance_name>_compact.csv を展開して Solutions_<instance_name>.csv に出力する"""
+        Csv.write(
+            workspace_base_folder / 'Output' / f'Solutions_{instance_name}.csv',
+            cls.cols_strategies,
+            Reader.read_strategies_compact(instance_name),
+        )
+
+    @classmethod
+    def __iter_strategy_rows(cls,
+            strategies: Iterable[tuple[list[Vertex], float]],
+            time_scale: int | None,
+            ) -> Iterator[tuple[int, str, str, list[str]]]:
+        """各チャートの (順位, 時間差, 時間, 面と累計ダイヤ数の文字列のリスト) を1個ずつ返す"""
+        time_prev: float | None = None
+        rank: int = 1
+        for index, strategy in enumerate(strategies):
+            if time_prev is None:
+                time_prev = strategy[1]
+            time_diff: float = strategy[1] - time_prev
+            #
+            level_num_cum_gems: list[str] = [
+                f'{v.level.ep_pg[0]}-{v.level.ep_pg[1]:0>2}({v.cumlative_num_gems:0>3})'
+                for v in strategy[0]
+            ]
+            #
+            if time_diff > (0.0009 if time_scale is None else 0):
+                rank = index + 1
+            yield (
+                rank,
+                cls.__format_time(time_diff, time_scale),
+                cls.__format_time(strategy[1], time_scale),
+                level_num_cum_gems,
+            )
+            time_prev = strategy[1]
+
+    @classmethod
+    def __iter_compact_rows(cls,
+            strategy_rows: Iterator[tuple[int, str, str, list[str]]],
+            ) -> Iterator[list[Any]]:
+        """各チャートの行を、1つ前のチャートと共通の先頭部分の面の個数と残りの部分の行に変換する"""
+        tokens_prev: list[str] = []
+        for rank, time_diff, time, tokens in strategy_rows:
+            prefix_length: int = 0
+            for t, t_prev in zip(tokens, tokens_prev):
+                if t != t_prev:
+                    break
+                prefix_length += 1
+            yield [rank, time_diff, time, prefix_length, ' -> '.join(tokens[prefix_length:])]
+            tokens_prev = tokens
+
+    @classmethod
+    def __format_time(cls, time: float, time_scale: int | None) -> str:
+        """時間を秒単位で小数第2位まで文字列にする(time_scale が None でない場合は 1 / time_scale 秒単位の整数から誤差なく変換する)"""
+        if time_scale is None:
+            return f'{time:.2f}'
+        return f'{decimal.Decimal(int(time)) / decimal.Decimal(time_scale):.2f}'
+# ----------------------------------------------------------------------
+# -----------------------------------------------------------------------------